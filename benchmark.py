@@ -0,0 +1,251 @@
+"""Map rendering benchmarks.
+
+Times CubiomesWrapper.generate_biome_image and MapGenerator.generate_map_image
+across versions, dimensions, zooms and sizes, with cold generators (seeded
+for every render) and warm ones (reused from the generator pool). Every case
+runs in a fresh process so its peak RSS is its own.
+
+Usage:
+    python benchmark.py --quick --save-baseline baseline.json
+    python benchmark.py --quick --baseline baseline.json --threshold 10
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import statistics
+import sys
+import time
+from typing import NamedTuple
+from waypoint_mapper import (
+    Colors,
+    Dimension,
+    Flags,
+    MapGenerator,
+    MinecraftVersion,
+)
+
+SEED = 132389425772377
+X, Z = -39272, -21656
+
+VERSIONS = (
+    MinecraftVersion.MC_1_12,
+    MinecraftVersion.MC_1_18,
+    MinecraftVersion.MC_NEWEST,
+)
+DIMENSIONS = (Dimension.OVERWORLD, Dimension.NETHER, Dimension.END)
+ZOOMS = (1.0, 0.25, 0.0625)
+IMAGE_SIZES = (256, 512)  # Biome image width and height in 1:4 cells
+ASPECT_RATIOS = (4 / 3, 16 / 9)  # Map width over its 600 pixel height
+
+
+class BenchmarkCase(NamedTuple):
+    target: str
+    version: MinecraftVersion
+    dimension: Dimension
+    zoom: float
+    size: float
+    warm: bool
+
+    @property
+    def name(self):
+        if self.target == "biome_image":
+            size = f"{self.size}x{self.size}"
+        else:
+            size = f"{int(600 * self.size)}x600"
+        return "/".join(
+            (
+                self.target,
+                self.version.name,
+                self.dimension.name.lower(),
+                f"zoom{self.zoom:g}",
+                size,
+                "warm" if self.warm else "cold",
+            )
+        )
+
+
+def benchmark_cases(quick=False):
+    versions = (
+        (MinecraftVersion.MC_1_12, MinecraftVersion.MC_NEWEST) if quick else VERSIONS
+    )
+    dimensions = (Dimension.OVERWORLD,) if quick else DIMENSIONS
+    zooms = (1.0, 0.0625) if quick else ZOOMS
+    image_sizes = IMAGE_SIZES[:1] if quick else IMAGE_SIZES
+    aspect_ratios = ASPECT_RATIOS[:1] if quick else ASPECT_RATIOS
+
+    cases = []
+    for version, dimension, warm in itertools.product(
+        versions, dimensions, (False, True)
+    ):
+        for size in image_sizes:
+            cases.append(
+                BenchmarkCase("biome_image", version, dimension, 1.0, size, warm)
+            )
+        for zoom, aspect_ratio in itertools.product(zooms, aspect_ratios):
+            cases.append(
+                BenchmarkCase("map", version, dimension, zoom, aspect_ratio, warm)
+            )
+    return cases
+
+
+def peak_rss_kb():
+    """Return the peak resident set size of this process in KiB, if known."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _run_case(args):
+    case, repeat, dll_path = args
+    generator = MapGenerator(dll_path)
+    cubiomes = generator.cubiomes
+
+    if case.target == "biome_image":
+        size = case.size
+        buffer = bytearray(cubiomes.get_image_size(size, size, 1))
+
+        def render():
+            cubiomes.generate_biome_image(
+                case.version.value,
+                Flags.DEFAULT.value,
+                SEED,
+                case.dimension.value,
+                X // 4 - size // 2,
+                Z // 4 - size // 2,
+                size,
+                size,
+                15,
+                1,
+                1,
+                4,
+                buffer,
+            )
+
+    else:
+
+        def render():
+            generator.generate_map_image(
+                "Benchmark",
+                Colors.AQUA,
+                X,
+                Z,
+                case.dimension,
+                SEED,
+                case.version,
+                Flags.DEFAULT,
+                zoom=case.zoom,
+                aspect_ratio=case.size,
+            )
+
+    # Untimed first render, which also seeds the generator for warm runs
+    render()
+    times = []
+    for _ in range(repeat):
+        if not case.warm:
+            cubiomes.generator_pool.clear()
+        started = time.perf_counter()
+        render()
+        times.append(time.perf_counter() - started)
+
+    median = statistics.median(times)
+    return {
+        "min": min(times),
+        "median": median,
+        "maps_per_second": 1 / median if median else float("inf"),
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def run_benchmarks(cases, repeat=5, dll_path=None):
+    """Run every case in its own spawned process.
+
+    Returns:
+        dict: Results keyed by case name.
+    """
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        results = pool.imap(_run_case, [(case, repeat, dll_path) for case in cases])
+        return {case.name: result for case, result in zip(cases, results)}
+
+
+def compare(results, baseline, threshold):
+    """Return the cases whose median time regressed past threshold percent."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = (result["median"] - before["median"]) / before["median"] * 100
+        if change > threshold:
+            regressions.append((name, before["median"], result["median"], change))
+    return regressions
+
+
+def print_results(results):
+    width = max(len(name) for name in results)
+    print(
+        f"{'case':<{width}}  {'median ms':>10}  {'min ms':>10}  {'maps/s':>8}  {'peak RSS MiB':>12}"
+    )
+    for name, result in results.items():
+        rss = result["peak_rss_kb"]
+        rss = "-" if rss is None else f"{rss / 1024:.1f}"
+        print(
+            f"{name:<{width}}  {result['median'] * 1000:>10.2f}  "
+            f"{result['min'] * 1000:>10.2f}  {result['maps_per_second']:>8.2f}  {rss:>12}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="run a reduced case set")
+    parser.add_argument("--repeat", type=int, default=5, help="timed renders per case")
+    parser.add_argument("--filter", default="", help="only run cases containing this")
+    parser.add_argument(
+        "--dll-path", help="use the ctypes wrapper library at this path"
+    )
+    parser.add_argument(
+        "--save-baseline", metavar="PATH", help="write results as a baseline"
+    )
+    parser.add_argument("--baseline", metavar="PATH", help="compare against a baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="fail when a median slows down by more than this percent",
+    )
+    args = parser.parse_args()
+
+    cases = [case for case in benchmark_cases(args.quick) if args.filter in case.name]
+    if not cases:
+        parser.error("no benchmark cases match the filter")
+
+    results = run_benchmarks(cases, args.repeat, args.dll_path)
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, change in regressions:
+            print(
+                f"REGRESSION {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms "
+                f"(+{change:.1f}%)"
+            )
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold:g}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,71 @@
+import asyncio
 import discord
 import logging
-import re
 import sys
 from discord.ext import commands
-from sqlalchemy.orm import Session
-from database.session import session
-from models.server_config import Base, ServerConfig
-from commands.commands import ping, setprefix, PrefixRequest
+from sqlalchemy import select
+from database.ingest import WaypointIngestQueue
+from database.prefixes import PrefixCache
+from database.session import async_engine, read_session, write_session
+from models.server_config import ServerConfig
+from commands.commands import (
+    import_waypoints,
+    ping,
+    setprefix,
+    setseed,
+    show_map,
+    MAX_ZOOM,
+    MIN_ZOOM,
+    ImportRequest,
+    MapRequest,
+    PrefixRequest,
+    SeedRequest,
+)
 from utils.logging_setup import setup_logging
-from schemas.waypoint import CoordinateCreate, WaypointCreate
-from models.coordinate import Coordinate as CoordinateModel
-from models.waypoint import Waypoint as WaypointModel
+from utils.waypoint_parser import parse_waypoints
+from models.map_config import MapConfig
+from waypoint_mapper import (
+    Dimension,
+    Flags,
+    HistogramSink,
+    MapEncoder,
+    MinecraftVersion,
+    PrewarmScheduler,
+    RenderPool,
+)
 
 # Setup logging
 setup_logging()
 
-# Create tables
-Base.metadata.create_all(bind=session.bind)
+# Waypoints from chat are written in batches
+ingest = WaypointIngestQueue()
+
+
+class WaypointWizard(commands.Bot):
+    async def setup_hook(self) -> None:
+        # Started before any event, so on_message can always schedule
+        ingest.start()
+        prewarm.start()
 
-# Bot setup
+    async def close(self) -> None:
+        # Write every waypoint still queued before the loop goes away
+        await ingest.stop()
+        await prewarm.stop()
+        await super().close()
+        await async_engine.dispose()
+
+
+# Bot setup, each guild's prefix is read once and then served from memory
+prefixes = PrefixCache()
 intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="$", intents=intents)
+bot = WaypointWizard(command_prefix=prefixes, intents=intents)
+
+# Map rendering, encoding and background pre-rendering share one tile cache
+TILE_CACHE_DIR = "./tile_cache"
+metrics = HistogramSink()
+render_pool = RenderPool(tile_cache_dir=TILE_CACHE_DIR, metrics=metrics)
+encoder = MapEncoder(metrics=metrics)
+prewarm = PrewarmScheduler(tile_cache_dir=TILE_CACHE_DIR)
 
 
 def signal_handler(signum, frame):
@@ -28,6 +73,27 @@ def signal_handler(signum, frame):
     sys.exit(0)
 
 
+async def schedule_prewarm(guild, waypoints) -> None:
+    """Queue new waypoints' maps for pre-rendering if their guild has a seed."""
+    if guild is None:
+        return
+    async with read_session() as db_session:
+        config = await db_session.scalar(
+            select(MapConfig).filter_by(server_id=str(guild.id))
+        )
+    if config is None:
+        return
+    for waypoint in waypoints:
+        prewarm.schedule(
+            waypoint.x,
+            waypoint.z,
+            Dimension.from_xaero(waypoint.dimension),
+            config.seed,
+            MinecraftVersion[config.version],
+            Flags.DEFAULT,
+        )
+
+
 @bot.event
 async def on_ready() -> None:
     """Perform startup tasks when the bot is ready."""
@@ -44,72 +110,26 @@ async def on_message(message) -> None:
     if message.author.bot and not message.webhook_id:
         return
 
-    pattern = r"xaero-waypoint:([^:]+):([^:]+):([^:]+):([^:]+):([^:]+):([^:]+):([^:]+):([^:]+):([^:]+)"
-    match = re.match(pattern, message.content)
-
-    if match:
-        waypoint = {
-            "name": match.group(1),
-            "type": match.group(2),
-            "x": int(match.group(3)),
-            "y": int(match.group(4)),
-            "z": int(match.group(5)),
-            "color": int(match.group(6)),
-            "visibility": match.group(7) == "true",
-            "yaw": int(match.group(8)),
-            "dimension": match.group(9),
-            "file": "default_file",  # Assuming file field
-        }
-
-        # Validate the coordinate data
+    guild_id = str(message.guild.id) if message.guild else None
+    waypoints, invalid = parse_waypoints(message.content, guild_id)
+    if invalid:
+        await message.channel.send(f"Skipped {invalid} invalid waypoint(s).")
+
+    if waypoints:
         try:
-            coordinate_data = CoordinateCreate(
-                x=waypoint["x"], y=waypoint["y"], z=waypoint["z"]
-            )
-            waypoint_data = WaypointCreate(
-                name=waypoint["name"],
-                type=waypoint["type"],
-                color=waypoint["color"],
-                visibility=waypoint["visibility"],
-                dimension=waypoint["dimension"],
-                file=waypoint["file"],
-                coordinate_id=None,  # This will be set after creating the coordinate
-            )
+            # Queued together, so a pasted list is written in one batch
+            await asyncio.gather(*(ingest.submit(waypoint) for waypoint in waypoints))
+
+            # Render the new waypoints' maps before anyone asks for them
+            await schedule_prewarm(message.guild, waypoints)
 
-            # Create a new database session
-            db_session = session()
-
-            try:
-                # Create a new coordinate
-                new_coordinate = CoordinateModel(
-                    x=coordinate_data.x, y=coordinate_data.y, z=coordinate_data.z
-                )
-                db_session.add(new_coordinate)
-                db_session.commit()
-                db_session.refresh(new_coordinate)
-
-                # Create a new waypoint
-                new_waypoint = WaypointModel(
-                    name=waypoint_data.name,
-                    type=waypoint_data.type,
-                    color=waypoint_data.color,
-                    visibility=waypoint_data.visibility,
-                    dimension=waypoint_data.dimension,
-                    file=waypoint_data.file,
-                    coordinate_id=new_coordinate.id,
-                )
-                db_session.add(new_waypoint)
-                db_session.commit()
-
-                # Send a confirmation message
-                await message.channel.send(f"Waypoint '{waypoint['name']}' processed.")
-            except Exception as e:
-                db_session.rollback()
-                await message.channel.send(f"Error processing waypoint: {str(e)}")
-            finally:
-                db_session.close()
+            # Send a confirmation message
+            if len(waypoints) == 1:
+                await message.channel.send(f"Waypoint '{waypoints[0].name}' processed.")
+            else:
+                await message.channel.send(f"{len(waypoints)} waypoints processed.")
         except Exception as e:
-            await message.channel.send(f"Invalid waypoint data: {str(e)}")
+            await message.channel.send(f"Error processing waypoint: {str(e)}")
 
     # Ensure other commands and events are still processed
     await bot.process_commands(message)
@@ -120,23 +140,65 @@ async def on_message(message) -> None:
 )
 async def setprefix_command(interaction: discord.Interaction, prefix: str):
     request = PrefixRequest(prefix=prefix)
-    await setprefix(interaction, request, session)
+    await setprefix(interaction, request, write_session, prefixes)
+
+
+@bot.tree.command(
+    name="setseed", description="Set the Minecraft world seed used for maps"
+)
+async def setseed_command(
+    interaction: discord.Interaction, seed: str, version: str = "MC_NEWEST"
+):
+    try:
+        request = SeedRequest(seed=seed, version=version)
+    except ValueError:
+        await interaction.response.send_message(f"Invalid seed: {seed}", ephemeral=True)
+        return
+
+    await setseed(interaction, request, write_session)
+
+
+@bot.tree.command(name="map", description="Show a map around a waypoint")
+async def map_command(
+    interaction: discord.Interaction,
+    name: str,
+    zoom: float = 1.0,
+    offset_x: int = 0,
+    offset_z: int = 0,
+):
+    try:
+        request = MapRequest(name=name, zoom=zoom, offset_x=offset_x, offset_z=offset_z)
+    except ValueError:
+        await interaction.response.send_message(
+            f"Zoom must be between 1/{1 / MIN_ZOOM:g} and {MAX_ZOOM:g}.", ephemeral=True
+        )
+        return
+
+    await show_map(interaction, request, read_session, render_pool, encoder, prewarm)
+
+
+@bot.tree.command(name="import", description="Import a Xaero waypoints file")
+async def import_command(
+    interaction: discord.Interaction,
+    file: discord.Attachment,
+    dimension: str = "overworld",
+):
+    request = ImportRequest(dimension=dimension)
+    await import_waypoints(interaction, file, request, write_session)
 
 
 # Event when bot joins a new guild
 @bot.event
 async def on_guild_join(guild):
-    db_session = session()
     try:
-        config = ServerConfig(server_id=str(guild.id))
-        db_session.add(config)
-        db_session.commit()
+        async with write_session() as db_session:
+            db_session.add(
+                ServerConfig(server_id=str(guild.id), prefix=prefixes.default)
+            )
+        prefixes.invalidate(str(guild.id))
         logging.info(f"Joined new guild: {guild.name}")
     except Exception as e:
-        db_session.rollback()
         logging.error(f"Error adding guild to database: {str(e)}")
-    finally:
-        db_session.close()
 
 
 # Run the bot
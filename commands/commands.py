@@ -1,18 +1,46 @@
 # commands/commands.py
 import discord
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from sqlalchemy import select
 from models.server_config import ServerConfig
+from models.map_config import MapConfig
+from models.waypoint import Waypoint
 from schemas.waypoint import WaypointBase, WaypointCreate
+import asyncio
 import logging
+import time
+from database.importer import import_attachment
+from waypoint_mapper import Colors, Dimension, Flags, MinecraftVersion
 
 
 class PrefixRequest(BaseModel):
     prefix: str
 
 
+class SeedRequest(BaseModel):
+    seed: int
+    version: str = "MC_NEWEST"
+
+
+class ImportRequest(BaseModel):
+    dimension: str = "overworld"
+
+
+# Past these a single /map would generate tens of thousands of tiles, or
+# nothing at all
+MIN_ZOOM = 1 / 256
+MAX_ZOOM = 16
+
+
+class MapRequest(BaseModel):
+    name: str
+    zoom: float = Field(1.0, ge=MIN_ZOOM, le=MAX_ZOOM)
+    offset_x: int = 0
+    offset_z: int = 0
+
+
 async def setprefix(
-    interaction: discord.Interaction, request: PrefixRequest, session: Session
+    interaction: discord.Interaction, request: PrefixRequest, session, prefixes
 ):
     if not interaction.user.guild_permissions.administrator:
         await interaction.response.send_message(
@@ -21,18 +49,171 @@ async def setprefix(
         return
 
     guild_id = str(interaction.guild.id)
-    config = session.query(ServerConfig).filter_by(server_id=guild_id).first()
-    if config:
-        config.prefix = request.prefix
-    else:
-        config = ServerConfig(server_id=guild_id, prefix=request.prefix)
-        session.add(config)
-    session.commit()
+    async with session() as db_session:
+        config = await db_session.scalar(
+            select(ServerConfig).filter_by(server_id=guild_id)
+        )
+        if config:
+            config.prefix = request.prefix
+        else:
+            db_session.add(ServerConfig(server_id=guild_id, prefix=request.prefix))
+    # Committed, so the next message picks up the new prefix
+    prefixes.invalidate(guild_id)
     await interaction.response.send_message(
         f"Prefix set to {request.prefix}", ephemeral=True
     )
 
 
+async def setseed(interaction: discord.Interaction, request: SeedRequest, session):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "You do not have permission to use this command.", ephemeral=True
+        )
+        return
+
+    if request.version not in MinecraftVersion.__members__:
+        await interaction.response.send_message(
+            f"Unknown Minecraft version: {request.version}", ephemeral=True
+        )
+        return
+
+    guild_id = str(interaction.guild.id)
+    async with session() as db_session:
+        config = await db_session.scalar(
+            select(MapConfig).filter_by(server_id=guild_id)
+        )
+        if config:
+            config.seed = request.seed
+            config.version = request.version
+        else:
+            db_session.add(
+                MapConfig(
+                    server_id=guild_id, seed=request.seed, version=request.version
+                )
+            )
+    await interaction.response.send_message(
+        f"Map seed set to {request.seed} ({request.version})", ephemeral=True
+    )
+
+
+async def show_map(
+    interaction: discord.Interaction,
+    request: MapRequest,
+    session,
+    render_pool,
+    encoder,
+    prewarm,
+):
+    guild_id = str(interaction.guild.id)
+    async with session() as db_session:
+        config = await db_session.scalar(
+            select(MapConfig).filter_by(server_id=guild_id)
+        )
+        waypoint = await db_session.scalar(
+            select(Waypoint).filter_by(guild_id=guild_id, name=request.name).limit(1)
+        )
+
+    if config is None:
+        await interaction.response.send_message(
+            "No map seed is set for this server, use /setseed first.", ephemeral=True
+        )
+        return
+    if waypoint is None:
+        await interaction.response.send_message(
+            f"Waypoint '{request.name}' not found.", ephemeral=True
+        )
+        return
+
+    # Rendering can outlast Discord's three second response window
+    await interaction.response.defer()
+
+    params = {
+        "name": waypoint.name,
+        "color": Colors.from_xaero(waypoint.color),
+        "x": waypoint.x + request.offset_x,
+        "z": waypoint.z + request.offset_z,
+        "dimension": Dimension.from_xaero(waypoint.dimension),
+        "seed": config.seed,
+        "version": MinecraftVersion[config.version],
+        "flags": Flags.DEFAULT,
+        "zoom": request.zoom,
+    }
+    prewarm.record_view(
+        params["x"],
+        params["z"],
+        params["dimension"],
+        params["seed"],
+        params["version"],
+        params["flags"],
+    )
+
+    async def render(**params):
+        # Panning a user's previous map only generates the newly exposed strips
+        async with prewarm.interactive():
+            return await render_pool.render_map_image(
+                **params, viewport=interaction.user.id, timeout=60
+            )
+
+    try:
+        image = await encoder.render(render, **params)
+    except asyncio.TimeoutError:
+        await interaction.followup.send("Map rendering timed out.")
+        return
+    except Exception as e:
+        logging.error(f"Failed to render map for '{request.name}': {e}")
+        await interaction.followup.send(f"Failed to render map: {e}")
+        return
+
+    await interaction.followup.send(
+        file=discord.File(image, filename=f"{waypoint.name}.{encoder.extension}")
+    )
+
+
+async def import_waypoints(
+    interaction: discord.Interaction,
+    attachment: discord.Attachment,
+    request: ImportRequest,
+    session,
+):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "You do not have permission to use this command.", ephemeral=True
+        )
+        return
+
+    dimension = Dimension.__members__.get(request.dimension.upper())
+    if dimension is None or dimension is Dimension.DIM_UNDEF:
+        await interaction.response.send_message(
+            f"Unknown dimension: {request.dimension}", ephemeral=True
+        )
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    last_update = time.monotonic()
+
+    async def progress(stats):
+        # Stay well under Discord's rate limit on message edits
+        nonlocal last_update
+        if time.monotonic() - last_update < 2:
+            return
+        last_update = time.monotonic()
+        await interaction.edit_original_response(content=f"Importing {stats}")
+
+    try:
+        stats = await import_attachment(
+            attachment,
+            dimension.name.lower(),
+            str(interaction.guild.id),
+            session_factory=session,
+            progress=progress,
+        )
+    except Exception as e:
+        logging.error(f"Error importing {attachment.filename}: {e}")
+        await interaction.edit_original_response(content=f"Import failed: {e}")
+        return
+    await interaction.edit_original_response(content=f"Imported {stats}")
+
+
 async def ping(interaction: discord.Interaction):
     logging.info(
         f"Ping command called by {interaction.user.name}#{interaction.user.discriminator}"
@@ -0,0 +1,221 @@
+# database/importer.py
+"""Bulk import of Xaero's Minimap waypoint files.
+
+Files are read as a stream, a batch of lines at a time, so memory use
+depends on the batch size and not on the file size.
+
+Usage:
+    python -m database.importer --guild-id 1234 XaeroWaypoints/*/dim%0/*.txt
+"""
+
+import argparse
+import asyncio
+import inspect
+import logging
+import os
+import aiohttp
+from database.ingest import upsert_waypoints
+from database.session import async_engine, write_session
+from utils.waypoint_parser import DEFAULT_Y, validate_waypoints
+
+
+class ImportProgress:
+    """Counts of an import so far, passed to the progress callback."""
+
+    def __init__(self, file):
+        self.file = file
+        self.lines = 0
+        self.imported = 0
+        self.skipped = 0
+
+    def __str__(self):
+        return (
+            f"{self.file}: {self.imported} imported, {self.skipped} skipped "
+            f"of {self.lines} lines"
+        )
+
+
+def parse_waypoint_line(line, dimension, file, guild_id=None):
+    """Parse one line of a Xaero waypoints file.
+
+    Lines look like
+    waypoint:name:initials:x:y:z:color:disabled:type:set:rotate:yaw:...
+    and are mapped the same way as waypoints shared in chat.
+
+    Args:
+        line (str): The line, with or without its newline.
+        dimension (str): The dimension of the file, such as "dim%-1".
+        file (str): The file name stored with the waypoint.
+        guild_id (str): The guild the waypoint belongs to.
+
+    Returns:
+        dict: Unvalidated WaypointCreate fields, or None for blank lines,
+            comments and set declarations.
+
+    Raises:
+        ValueError: The line is not a waypoint.
+    """
+    line = line.strip()
+    if not line or line.startswith("#") or line.startswith("sets:"):
+        return None
+    fields = line.split(":")
+    if fields[0] != "waypoint" or len(fields) < 9:
+        raise ValueError(f"Not a waypoint: {line[:80]}")
+    return {
+        # Xaero escapes colons in names as "§§"
+        "name": fields[1].replace("§§", ":"),
+        "type": fields[2],
+        "x": fields[3],
+        "y": DEFAULT_Y if fields[4] == "~" else fields[4],
+        "z": fields[5],
+        "color": fields[6],
+        # Xaero stores whether the waypoint is disabled, i.e. hidden
+        "visibility": fields[7] != "true",
+        "dimension": dimension,
+        "file": file,
+        "guild_id": guild_id,
+    }
+
+
+async def _iter_lines(lines):
+    if hasattr(lines, "__aiter__"):
+        async for line in lines:
+            yield line
+    else:
+        for line in lines:
+            yield line
+
+
+async def import_waypoints(
+    lines,
+    dimension,
+    file,
+    guild_id=None,
+    session_factory=write_session,
+    batch_size=5000,
+    progress=None,
+):
+    """Stream waypoints from the lines of a Xaero waypoints file into the database.
+
+    Every batch is validated together and inserted in its own write
+    transaction, so waypoints shared in chat are written in between. The
+    spatial index is updated once per batch, see upsert_waypoints.
+
+    Args:
+        lines: An iterable or async iterable of str or bytes lines.
+        dimension (str): The dimension of the file, such as "dim%-1".
+        file (str): The file name stored with each waypoint.
+        guild_id (str): The guild the waypoints belong to.
+        session_factory: Opens a committing session, see database.session.
+        batch_size (int): Lines validated and inserted per transaction.
+        progress (callable): Called, or awaited if it returns an awaitable,
+            with an ImportProgress after every batch.
+
+    Returns:
+        ImportProgress: The final counts.
+    """
+    stats = ImportProgress(file)
+
+    async def flush(rows):
+        waypoints, rejected = validate_waypoints(rows)
+        if waypoints:
+            async with session_factory() as db_session:
+                await upsert_waypoints(db_session, waypoints, bulk=True)
+        stats.imported += len(waypoints)
+        stats.skipped += rejected
+        if progress is not None:
+            result = progress(stats)
+            if inspect.isawaitable(result):
+                await result
+
+    rows = []
+    async for line in _iter_lines(lines):
+        stats.lines += 1
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        try:
+            row = parse_waypoint_line(line, dimension, file, guild_id)
+        except ValueError:
+            stats.skipped += 1
+            continue
+        if row is None:
+            continue
+        rows.append(row)
+        if len(rows) >= batch_size:
+            await flush(rows)
+            rows = []
+    if rows:
+        await flush(rows)
+    return stats
+
+
+async def import_file(path, dimension=None, guild_id=None, **kwargs):
+    """Import a waypoints file from disk.
+
+    Args:
+        path (str): The file, normally XaeroWaypoints/<world>/dim%<n>/<set>.txt.
+        dimension (str): Defaults to the name of the file's directory.
+
+    Returns:
+        ImportProgress: The final counts.
+    """
+    if dimension is None:
+        dimension = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    with open(path, encoding="utf-8", errors="replace") as lines:
+        return await import_waypoints(
+            lines, dimension, os.path.basename(path), guild_id, **kwargs
+        )
+
+
+async def import_attachment(attachment, dimension, guild_id=None, **kwargs):
+    """Import a waypoints file uploaded to Discord, streaming the download.
+
+    Args:
+        attachment (discord.Attachment): The uploaded file.
+        dimension (str): The dimension of the file, such as "dim%-1".
+
+    Returns:
+        ImportProgress: The final counts.
+    """
+    async with aiohttp.ClientSession() as http:
+        async with http.get(attachment.url) as response:
+            response.raise_for_status()
+            return await import_waypoints(
+                response.content, dimension, attachment.filename, guild_id, **kwargs
+            )
+
+
+async def _import_paths(paths, guild_id, dimension, batch_size):
+    try:
+        for path in paths:
+            stats = await import_file(
+                path,
+                dimension,
+                guild_id,
+                batch_size=batch_size,
+                progress=lambda stats: logging.info(str(stats)),
+            )
+            print(stats)
+    finally:
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import Xaero waypoint files")
+    parser.add_argument("paths", nargs="+", help="waypoint files to import")
+    parser.add_argument("--guild-id", help="the Discord guild the waypoints belong to")
+    parser.add_argument(
+        "--dimension", help="override the dimension taken from each file's directory"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=5000, help="waypoints per transaction"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(
+        _import_paths(args.paths, args.guild_id, args.dimension, args.batch_size)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# database/ingest.py
+import asyncio
+import logging
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.sqlite import insert
+from database.migrations import RTREE_BACKFILL
+from database.session import write_session
+from models.waypoint import Waypoint
+
+
+async def upsert_waypoints(db_session, waypoints, bulk=False):
+    """Insert waypoints, counting a reshare of a stored waypoint instead.
+
+    A waypoint whose fingerprint is already stored bumps that row's
+    share_count and last_seen, so the table grows with distinct waypoints
+    rather than with chat volume.
+
+    Args:
+        db_session (AsyncSession): An open write session.
+        waypoints (list): WaypointCreate models.
+        bulk (bool): Add the new waypoints to waypoint_rtree with one
+            statement after inserting them instead of row by row, which
+            is faster for thousands of waypoints.
+    """
+    table = Waypoint.__table__
+    if bulk:
+        last_id = await db_session.scalar(
+            select(func.coalesce(func.max(table.c.id), 0))
+        )
+        await db_session.execute(text("INSERT INTO waypoint_rtree_defer VALUES (1)"))
+    statement = insert(table).on_conflict_do_update(
+        index_elements=[table.c.fingerprint],
+        set_={
+            "share_count": table.c.share_count + 1,
+            "last_seen": func.current_timestamp(),
+        },
+    )
+    await db_session.execute(
+        statement, [waypoint.model_dump() for waypoint in waypoints]
+    )
+    if bulk:
+        await db_session.execute(text(RTREE_BACKFILL), {"last_id": last_id})
+        await db_session.execute(text("DELETE FROM waypoint_rtree_defer"))
+
+
+class WaypointIngestQueue:
+    """Buffers parsed waypoints and writes them in bulk transactions.
+
+    Waypoints are flushed when max_batch of them are waiting or
+    flush_interval seconds after the first one arrived, whichever comes
+    first. Every batch is inserted in a single write transaction, so a
+    burst of shared waypoints costs one commit per batch instead of one per
+    waypoint. stop() drains whatever is still queued, waypoints submitted
+    after that are written one at a time.
+    """
+
+    def __init__(
+        self,
+        session_factory=write_session,
+        max_batch: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue = None
+        self._task = None
+        self._stopped = False
+
+    def start(self):
+        """Start flushing on the running event loop."""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(self.max_pending)
+        self._stopped = False
+        self._task = asyncio.get_running_loop().create_task(self._run(self._queue))
+
+    async def stop(self):
+        """Flush every queued waypoint, then stop."""
+        if self._task is None:
+            return
+        queue, self._queue = self._queue, None
+        self._stopped = True
+        await queue.put(None)
+        await self._task
+        self._task = None
+
+        # Submitters that were still waiting for room in a full queue
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None and not item[1].done():
+                item[1].set_exception(RuntimeError("The ingest queue was stopped"))
+
+    async def submit(self, waypoint):
+        """Queue a waypoint and wait until its batch is committed.
+
+        Args:
+            waypoint (WaypointCreate): The validated waypoint.
+
+        Raises:
+            Exception: Whatever the database raised for this waypoint.
+        """
+        if self._queue is None:
+            if not self._stopped:
+                raise RuntimeError("The ingest queue has not been started")
+            # Messages still arrive while the bot shuts down
+            async with self.session_factory() as db_session:
+                await upsert_waypoints(db_session, [waypoint])
+            return
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((waypoint, future))
+        await future
+
+    async def _run(self, queue):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is None:
+                break
+
+            # Collect until the batch is full or the window closes
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout > 0:
+                        item = await asyncio.wait_for(queue.get(), timeout)
+                    else:
+                        item = queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+        # Drain anything submitted behind the stop marker
+        remaining = []
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.max_batch):
+            await self._flush(remaining[start : start + self.max_batch])
+
+    async def _flush(self, batch):
+        results = await self._write(batch)
+        for (_, future), error in zip(batch, results):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    async def _write(self, batch):
+        """Insert a batch in one transaction, falling back to one at a time.
+
+        Returns:
+            list: None or the exception raised, per waypoint.
+        """
+        try:
+            async with self.session_factory() as db_session:
+                await self._insert(db_session, batch)
+            return [None] * len(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                logging.error(f"Error ingesting waypoint: {e}")
+                return [e]
+
+        # Isolate the waypoints that made the batch fail
+        results = []
+        for item in batch:
+            results.extend(await self._write([item]))
+        return results
+
+    @staticmethod
+    async def _insert(db_session, batch):
+        await upsert_waypoints(db_session, [waypoint for waypoint, _ in batch])
@@ -0,0 +1,343 @@
+# database/migrations.py
+import logging
+from contextlib import contextmanager
+from sqlalchemy import inspect, text
+from schemas.waypoint import waypoint_fingerprint
+
+RTREE_TABLE = """CREATE VIRTUAL TABLE IF NOT EXISTS waypoint_rtree USING rtree(
+    id, min_x, max_x, min_z, max_z, +guild_id, +dimension
+)"""
+
+# While this table holds a row, inserted waypoints are not indexed one by
+# one. Bulk inserts add the row in their transaction, index every new
+# waypoint with RTREE_BACKFILL and delete the row again before committing.
+RTREE_DEFER_TABLE = """CREATE TABLE IF NOT EXISTS waypoint_rtree_defer (
+    id INTEGER NOT NULL PRIMARY KEY
+)"""
+
+
+def _columns(connection, table):
+    return {row[1] for row in connection.execute(text(f"PRAGMA table_info({table})"))}
+
+
+def _dimension_case(dimension, nether, end, overworld):
+    """SQL mapping a Xaero dimension string like Dimension.from_xaero."""
+    return f"""CASE
+        WHEN lower({dimension}) LIKE '%nether%' OR {dimension} LIKE '%dim%-1%' THEN {nether}
+        WHEN lower({dimension}) LIKE '%end%' OR {dimension} LIKE '%dim%1%' THEN {end}
+        ELSE {overworld}
+    END"""
+
+
+def _dimension_code(dimension):
+    """SQL mapping a Xaero dimension string to -1, 0 or 1."""
+    return _dimension_case(dimension, -1, 1, 0)
+
+
+# Indexes the waypoints inserted after :last_id while waypoint_rtree_defer
+# holds a row
+RTREE_BACKFILL = f"""INSERT INTO waypoint_rtree
+SELECT id, x, x, z, z, guild_id, {_dimension_code("dimension")}
+FROM waypoints WHERE id > :last_id"""
+
+
+def add_spatial_index(connection):
+    """Add waypoints.guild_id and an R*Tree over waypoint positions.
+
+    The R*Tree is kept in sync with waypoints and coordinates by triggers,
+    and carries the guild and dimension of each waypoint so queries can be
+    scoped without a join. The column, the virtual table and the triggers
+    are created in migrate()'s transaction, so an interrupted run leaves
+    none of them behind.
+    """
+    if "guild_id" not in _columns(connection, "waypoints"):
+        connection.execute(text("ALTER TABLE waypoints ADD COLUMN guild_id VARCHAR"))
+
+    statements = [
+        RTREE_TABLE,
+        f"""CREATE TRIGGER IF NOT EXISTS waypoints_rtree_insert
+        AFTER INSERT ON waypoints BEGIN
+            INSERT INTO waypoint_rtree
+            SELECT NEW.id, c.x, c.x, c.z, c.z, NEW.guild_id,
+                {_dimension_code("NEW.dimension")}
+            FROM coordinates c WHERE c.id = NEW.coordinate_id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS waypoints_rtree_update
+        AFTER UPDATE OF guild_id, dimension, coordinate_id ON waypoints BEGIN
+            DELETE FROM waypoint_rtree WHERE id = OLD.id;
+            INSERT INTO waypoint_rtree
+            SELECT NEW.id, c.x, c.x, c.z, c.z, NEW.guild_id,
+                {_dimension_code("NEW.dimension")}
+            FROM coordinates c WHERE c.id = NEW.coordinate_id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS waypoints_rtree_delete
+        AFTER DELETE ON waypoints BEGIN
+            DELETE FROM waypoint_rtree WHERE id = OLD.id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS coordinates_rtree_update
+        AFTER UPDATE OF x, z ON coordinates BEGIN
+            UPDATE waypoint_rtree
+            SET min_x = NEW.x, max_x = NEW.x, min_z = NEW.z, max_z = NEW.z
+            WHERE id IN (SELECT id FROM waypoints WHERE coordinate_id = NEW.id);
+        END""",
+        # Index waypoints stored before the R*Tree existed
+        f"""INSERT INTO waypoint_rtree
+        SELECT w.id, c.x, c.x, c.z, c.z, w.guild_id, {_dimension_code("w.dimension")}
+        FROM waypoints w JOIN coordinates c ON c.id = w.coordinate_id
+        WHERE w.id NOT IN (SELECT id FROM waypoint_rtree)""",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def _create_spatial_triggers(connection):
+    """Keep waypoint_rtree in sync with the x and z stored on each waypoint."""
+    statements = [
+        RTREE_DEFER_TABLE,
+        f"""CREATE TRIGGER IF NOT EXISTS waypoints_rtree_insert
+        AFTER INSERT ON waypoints
+        WHEN NOT EXISTS (SELECT 1 FROM waypoint_rtree_defer) BEGIN
+            INSERT INTO waypoint_rtree VALUES (
+                NEW.id, NEW.x, NEW.x, NEW.z, NEW.z, NEW.guild_id,
+                {_dimension_code("NEW.dimension")}
+            );
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS waypoints_rtree_update
+        AFTER UPDATE OF guild_id, dimension, x, z ON waypoints BEGIN
+            DELETE FROM waypoint_rtree WHERE id = OLD.id;
+            INSERT INTO waypoint_rtree VALUES (
+                NEW.id, NEW.x, NEW.x, NEW.z, NEW.z, NEW.guild_id,
+                {_dimension_code("NEW.dimension")}
+            );
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS waypoints_rtree_delete
+        AFTER DELETE ON waypoints BEGIN
+            DELETE FROM waypoint_rtree WHERE id = OLD.id;
+        END""",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def denormalize_waypoints(connection):
+    """Move x, y and z from the coordinates table onto the waypoint rows.
+
+    SQLite cannot drop coordinate_id's NOT NULL constraint in place, so the
+    table is rebuilt and renamed, keeping every waypoint id. migrate() runs
+    the rebuild in one transaction and WAL readers keep seeing the old table
+    until it commits. The R*Tree entries stay valid, only its triggers are
+    replaced.
+    """
+    statements = [
+        "DROP TABLE IF EXISTS waypoints_new",
+        """CREATE TABLE waypoints_new (
+            id INTEGER NOT NULL,
+            name VARCHAR NOT NULL,
+            type VARCHAR NOT NULL,
+            color INTEGER NOT NULL,
+            visibility INTEGER NOT NULL,
+            dimension VARCHAR NOT NULL,
+            file VARCHAR NOT NULL,
+            guild_id VARCHAR,
+            x INTEGER NOT NULL,
+            y INTEGER NOT NULL,
+            z INTEGER NOT NULL,
+            PRIMARY KEY (id)
+        )""",
+        """INSERT INTO waypoints_new
+        SELECT w.id, w.name, w.type, w.color, w.visibility, w.dimension, w.file,
+            w.guild_id, c.x, c.y, c.z
+        FROM waypoints w JOIN coordinates c ON c.id = w.coordinate_id""",
+        # Also drops the old tables' triggers, which must go before the rename
+        "DROP TABLE waypoints",
+        "DROP TABLE coordinates",
+        "ALTER TABLE waypoints_new RENAME TO waypoints",
+        """CREATE INDEX ix_waypoints_guild_dimension_x_z
+        ON waypoints (guild_id, dimension, x, z)""",
+        "CREATE INDEX ix_waypoints_guild_name ON waypoints (guild_id, name)",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+    _create_spatial_triggers(connection)
+
+
+def _fingerprint_rows(connection):
+    """Set the fingerprint of every waypoint from its current columns."""
+    # SQLite has no hash functions, so fingerprints are computed here, a
+    # chunk of rows at a time
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            text("""SELECT id, guild_id, name, dimension, x, y, z, color
+                FROM waypoints WHERE id > :last_id ORDER BY id LIMIT 10000"""),
+            {"last_id": last_id},
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            text("UPDATE waypoints SET fingerprint = :fingerprint WHERE id = :id"),
+            [
+                {"id": row[0], "fingerprint": waypoint_fingerprint(*row[1:])}
+                for row in rows
+            ],
+        )
+        last_id = rows[-1][0]
+
+
+def deduplicate_waypoints(connection):
+    """Fingerprint waypoints, fold duplicates together and index the fingerprints.
+
+    Each set of duplicates keeps its oldest row, with a share count of the
+    number of copies. SQLite cannot add NOT NULL columns without a constant
+    default, so the table is rebuilt like in denormalize_waypoints to end up
+    with the same schema as a new database.
+    """
+    # Guarded so the migration can rerun whatever state it was left in
+    if "fingerprint" not in _columns(connection, "waypoints"):
+        connection.execute(text("ALTER TABLE waypoints ADD COLUMN fingerprint VARCHAR"))
+    _fingerprint_rows(connection)
+
+    statements = [
+        "DROP TABLE IF EXISTS waypoints_new",
+        """CREATE TABLE waypoints_new (
+            id INTEGER NOT NULL,
+            name VARCHAR NOT NULL,
+            type VARCHAR NOT NULL,
+            color INTEGER NOT NULL,
+            visibility INTEGER NOT NULL,
+            dimension VARCHAR NOT NULL,
+            file VARCHAR NOT NULL,
+            guild_id VARCHAR,
+            x INTEGER NOT NULL,
+            y INTEGER NOT NULL,
+            z INTEGER NOT NULL,
+            fingerprint VARCHAR NOT NULL,
+            share_count INTEGER DEFAULT '1' NOT NULL,
+            last_seen DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+            PRIMARY KEY (id)
+        )""",
+        """INSERT INTO waypoints_new
+        SELECT w.id, w.name, w.type, w.color, w.visibility, w.dimension, w.file,
+            w.guild_id, w.x, w.y, w.z, w.fingerprint, copies.total,
+            CURRENT_TIMESTAMP
+        FROM waypoints w JOIN (
+            SELECT MIN(id) AS id, COUNT(*) AS total FROM waypoints
+            GROUP BY fingerprint
+        ) AS copies ON copies.id = w.id""",
+        # Also drops the old table's triggers
+        "DROP TABLE waypoints",
+        "ALTER TABLE waypoints_new RENAME TO waypoints",
+        "DELETE FROM waypoint_rtree WHERE id NOT IN (SELECT id FROM waypoints)",
+        """CREATE INDEX ix_waypoints_guild_dimension_x_z
+        ON waypoints (guild_id, dimension, x, z)""",
+        "CREATE INDEX ix_waypoints_guild_name ON waypoints (guild_id, name)",
+        "CREATE UNIQUE INDEX ix_waypoints_fingerprint ON waypoints (fingerprint)",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+    _create_spatial_triggers(connection)
+
+
+def normalize_dimensions(connection):
+    """Store every dimension as "overworld", "nether" or "end".
+
+    Imported and shared copies of a waypoint had different dimension
+    strings, so fingerprints are recomputed and the duplicates this reveals
+    are folded into the oldest row, summing their share counts.
+    """
+    name = _dimension_case("dimension", "'nether'", "'end'", "'overworld'")
+    statements = [
+        "DROP INDEX IF EXISTS ix_waypoints_fingerprint",
+        f"UPDATE waypoints SET dimension = {name}",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+    _fingerprint_rows(connection)
+
+    statements = [
+        """UPDATE waypoints
+        SET share_count = duplicates.total, last_seen = duplicates.last_seen
+        FROM (
+            SELECT MIN(id) AS id, SUM(share_count) AS total,
+                MAX(last_seen) AS last_seen
+            FROM waypoints GROUP BY fingerprint HAVING COUNT(*) > 1
+        ) AS duplicates
+        WHERE waypoints.id = duplicates.id""",
+        """DELETE FROM waypoints
+        WHERE id NOT IN (SELECT MIN(id) FROM waypoints GROUP BY fingerprint)""",
+        "CREATE UNIQUE INDEX ix_waypoints_fingerprint ON waypoints (fingerprint)",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+@contextmanager
+def _transaction(engine):
+    """Open a connection whose statements, DDL included, form one transaction.
+
+    pysqlite commits DDL that comes before the first DML statement of a
+    transaction, so a migration interrupted halfway would stay half
+    applied. The driver's transaction handling is turned off and the
+    transaction is begun and ended explicitly instead.
+    """
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+
+def defer_bulk_spatial_index(connection):
+    """Let bulk inserts index their waypoints after inserting them.
+
+    Maintaining the R*Tree row by row from the insert trigger dominated
+    large imports, see RTREE_DEFER_TABLE.
+    """
+    connection.execute(text("DROP TRIGGER IF EXISTS waypoints_rtree_insert"))
+    _create_spatial_triggers(connection)
+
+
+# Applied in order, PRAGMA user_version records how many have run
+MIGRATIONS = [
+    add_spatial_index,
+    denormalize_waypoints,
+    deduplicate_waypoints,
+    normalize_dimensions,
+    defer_bulk_spatial_index,
+]
+
+
+def migrate(engine, metadata):
+    """Create missing tables and bring an existing schema up to date.
+
+    A new database gets the current schema and the spatial index directly.
+    Otherwise every pending migration runs in its own transaction, together
+    with the user_version update that records it, so an interrupted
+    migration is rolled back and retried on the next start.
+
+    Args:
+        engine (Engine): A synchronous engine for the database.
+        metadata (MetaData): The metadata of every model.
+    """
+    with _transaction(engine) as connection:
+        version = connection.execute(text("PRAGMA user_version")).scalar()
+        if not inspect(connection).has_table("waypoints"):
+            metadata.create_all(connection)
+            connection.execute(text(RTREE_TABLE))
+            _create_spatial_triggers(connection)
+            connection.execute(text(f"PRAGMA user_version = {len(MIGRATIONS)}"))
+            return
+
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        logging.info(f"Applying database migration {number}: {migration.__name__}")
+        with _transaction(engine) as connection:
+            migration(connection)
+            connection.execute(text(f"PRAGMA user_version = {number}"))
+
+    # Tables added since the database was created
+    with _transaction(engine) as connection:
+        metadata.create_all(connection)
@@ -0,0 +1,62 @@
+# database/prefixes.py
+from collections import OrderedDict
+from sqlalchemy import select
+from database.session import read_session
+from models.server_config import ServerConfig
+
+
+class PrefixCache:
+    """Resolves each guild's command prefix, caching it in memory.
+
+    A guild's prefix is read from its ServerConfig the first time one of
+    its messages is seen and served from memory afterwards. Writers call
+    invalidate() after changing a ServerConfig. The least recently used
+    guilds are dropped once max_guilds are cached.
+
+    An instance can be passed to commands.Bot as its command_prefix.
+    """
+
+    def __init__(self, session_factory=read_session, default="$", max_guilds=10000):
+        self.session_factory = session_factory
+        self.default = default
+        self.max_guilds = max_guilds
+        self._prefixes = OrderedDict()
+        # Bumped by invalidate() so a load that raced it is not cached
+        self._generation = 0
+
+    async def __call__(self, bot, message):
+        if message.guild is None:
+            return self.default
+        return await self.get(str(message.guild.id))
+
+    async def get(self, guild_id):
+        """Return a guild's prefix, loading it on a cache miss.
+
+        Args:
+            guild_id (str): The Discord guild id.
+
+        Returns:
+            str: The stored prefix, or the default for unconfigured guilds.
+        """
+        prefix = self._prefixes.get(guild_id)
+        if prefix is not None:
+            self._prefixes.move_to_end(guild_id)
+            return prefix
+
+        generation = self._generation
+        async with self.session_factory() as db_session:
+            prefix = await db_session.scalar(
+                select(ServerConfig.prefix).filter_by(server_id=guild_id)
+            )
+        # Guilds without a config are cached too, until they get one
+        prefix = prefix or self.default
+        if generation == self._generation:
+            self._prefixes[guild_id] = prefix
+            if len(self._prefixes) > self.max_guilds:
+                self._prefixes.popitem(last=False)
+        return prefix
+
+    def invalidate(self, guild_id):
+        """Forget a guild's prefix so the next message reloads it."""
+        self._generation += 1
+        self._prefixes.pop(guild_id, None)
@@ -1,19 +1,83 @@
 # database/session.py
-from sqlalchemy import create_engine
+import asyncio
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from models.coordinate import Base as CoordinateBase
-from models.waypoint import Base as WaypointBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from database.migrations import migrate
+from models.base import Base
 
-DATABASE_URL = "sqlite:///bot.db"
+# Registers every model's table on Base
+from models import map_config, server_config, waypoint
+
+DATABASE_PATH = "bot.db"
+DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+
+# Applied to every new connection. WAL lets readers run alongside the
+# writer, and NORMAL only fsyncs at checkpoints, which is safe in WAL mode.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64000,  # 64 MiB
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def _set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+# Synchronous engine for scripts and startup tasks
 engine = create_engine(DATABASE_URL)
+event.listen(engine, "connect", _set_pragmas)
 Session = sessionmaker(bind=engine)
 
+# Asynchronous engine used by the bot, pooled so readers reuse connections
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=8,
+    max_overflow=8,
+)
+event.listen(async_engine.sync_engine, "connect", _set_pragmas)
+AsyncSessionFactory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# SQLite allows one writer at a time, so writes queue here instead of
+# retrying on a locked database
+_write_lock = asyncio.Lock()
+
 
 # Use a session factory instead of a single session instance
 def session():
     return Session()
 
 
-# Create all tables
-CoordinateBase.metadata.create_all(bind=engine)
-WaypointBase.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def read_session():
+    """Open an async session for lookups, which never wait on writes."""
+    async with AsyncSessionFactory() as db_session:
+        yield db_session
+
+
+@asynccontextmanager
+async def write_session():
+    """Open an async session whose transaction commits on exit.
+
+    Writers run one at a time. The transaction is rolled back if the block
+    raises.
+    """
+    async with _write_lock:
+        async with AsyncSessionFactory() as db_session:
+            async with db_session.begin():
+                yield db_session
+
+
+# Create all tables, or apply schema changes to an existing database
+migrate(engine, Base.metadata)
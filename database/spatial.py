@@ -0,0 +1,106 @@
+# database/spatial.py
+import math
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, select
+from models.waypoint import Waypoint
+
+# Created and kept in sync by database.migrations, so it lives outside
+# Base.metadata and create_all never touches it
+waypoint_rtree = Table(
+    "waypoint_rtree",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("min_x", Float),
+    Column("max_x", Float),
+    Column("min_z", Float),
+    Column("max_z", Float),
+    Column("guild_id", String),
+    Column("dimension", Integer),
+)
+
+# Farther than any two points inside the world border
+MAX_DISTANCE = 60_000_000
+
+
+def _in_box(guild_id, dimension, min_x, min_z, max_x, max_z):
+    """Select waypoints whose R*Tree entry overlaps the box."""
+    return (
+        select(Waypoint)
+        .join(waypoint_rtree, waypoint_rtree.c.id == Waypoint.id)
+        .where(
+            waypoint_rtree.c.max_x >= min_x,
+            waypoint_rtree.c.min_x <= max_x,
+            waypoint_rtree.c.max_z >= min_z,
+            waypoint_rtree.c.min_z <= max_z,
+            waypoint_rtree.c.guild_id == guild_id,
+            waypoint_rtree.c.dimension == int(dimension),
+        )
+    )
+
+
+def _distance(waypoint, x, z):
+    return math.hypot(waypoint.x - x, waypoint.z - z)
+
+
+async def waypoints_in_bbox(
+    db_session, guild_id, dimension, min_x, min_z, max_x, max_z
+):
+    """Return a guild's waypoints inside a block-coordinate rectangle.
+
+    Args:
+        db_session (AsyncSession): An open session, see database.session.
+        guild_id (str): The Discord guild the waypoints were shared in.
+        dimension (Dimension): The dimension to search.
+        min_x (int): The west edge, inclusive.
+        min_z (int): The north edge, inclusive.
+        max_x (int): The east edge, inclusive.
+        max_z (int): The south edge, inclusive.
+
+    Returns:
+        list: Waypoint models.
+    """
+    query = _in_box(guild_id, dimension, min_x, min_z, max_x, max_z).where(
+        Waypoint.x.between(min_x, max_x), Waypoint.z.between(min_z, max_z)
+    )
+    return list(await db_session.scalars(query))
+
+
+async def waypoints_within(db_session, guild_id, dimension, x, z, radius):
+    """Return a guild's waypoints within radius blocks of (x, z).
+
+    Returns:
+        list: (waypoint, distance) tuples, nearest first.
+    """
+    dx = Waypoint.x - x
+    dz = Waypoint.z - z
+    query = (
+        _in_box(guild_id, dimension, x - radius, z - radius, x + radius, z + radius)
+        .where(dx * dx + dz * dz <= radius * radius)
+        .order_by(dx * dx + dz * dz)
+    )
+    waypoints = await db_session.scalars(query)
+    return [(waypoint, _distance(waypoint, x, z)) for waypoint in waypoints]
+
+
+async def nearest_waypoints(
+    db_session, guild_id, dimension, x, z, k=5, max_distance=None, radius=256
+):
+    """Return a guild's k waypoints nearest to (x, z).
+
+    Searches a circle of the given radius and doubles it until k waypoints
+    fall inside it, so dense areas are answered from a few index pages.
+
+    Args:
+        k (int): How many waypoints to return at most.
+        max_distance (int): Ignore waypoints farther than this.
+        radius (int): The first search radius in blocks.
+
+    Returns:
+        list: (waypoint, distance) tuples, nearest first.
+    """
+    limit = MAX_DISTANCE if max_distance is None else max_distance
+    radius = min(radius, limit)
+    while True:
+        found = await waypoints_within(db_session, guild_id, dimension, x, z, radius)
+        if len(found) >= k or radius >= limit:
+            return found[:k]
+        radius = min(radius * 2, limit)
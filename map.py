@@ -1,30 +1,10 @@
-import ctypes
-from ctypes import c_int, c_uint64, POINTER, c_ubyte, string_at
-from PIL import Image, ImageDraw, ImageFont
 import io
+from PIL import Image, ImageDraw, ImageFont
+from waypoint_mapper import CubiomesWrapper
+from waypoint_mapper.tile_cache import sample_y
 
-# Load the DLL
-cubiomes = ctypes.CDLL("./waypoint_mapper/cubiomes_wrapper.dll")
-
-# Define the function signatures
-cubiomes.generate_biome_image.argtypes = [
-    c_int,
-    c_int,
-    c_uint64,
-    c_int,
-    c_int,
-    c_int,
-    c_int,
-    c_int,
-    c_int,
-    c_int,
-    c_int,
-]
-cubiomes.generate_biome_image.restype = None
-cubiomes.get_image_buffer.argtypes = []
-cubiomes.get_image_buffer.restype = POINTER(c_ubyte)
-cubiomes.get_image_size.argtypes = []
-cubiomes.get_image_size.restype = c_int
+# Load the native extension, or the wrapper library built next to it
+cubiomes = CubiomesWrapper()
 
 zoom = 0
 # Define the parameters
@@ -36,22 +16,18 @@ x = -(39272 // 16) - 32
 z = -(21656 // 16) - 32
 sx = 64  # Width in chunks
 sz = 64  # Height in chunks
-y = 15  # Near sea level
 sy = 1  # Single vertical layer
-pix4cell = 0  # Resolution of the output image
+pix4cell = 4  # Pixels per cell in the output image
+scale = 1  # Block-level sampling
+y = sample_y(scale)  # Near sea level
 
-# Call the function to generate the biome image
-cubiomes.generate_biome_image(
-    version, flags, seed, dimension, x, z, sx, sz, y, sy, pix4cell
+# Generate the biome image as PPM data
+image_data = cubiomes.generate_biome_image(
+    version, flags, seed, dimension, x, z, sx, sz, y, sy, pix4cell, scale
 )
 
-# Retrieve the image data from the DLL
-image_size = cubiomes.get_image_size()
-image_buffer = cubiomes.get_image_buffer()
-
 # Convert the image data to a format Pillow can read
-image_data = string_at(image_buffer, image_size)
-image = Image.open(io.BytesIO(image_data))
+image = Image.open(io.BytesIO(bytes(image_data)))
 
 
 def wrap_text(text, line_length):
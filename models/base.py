@@ -0,0 +1,5 @@
+# models/base.py
+from sqlalchemy.orm import declarative_base
+
+# Shared by every model so foreign keys and relationships resolve
+Base = declarative_base()
@@ -0,0 +1,11 @@
+# models/map_config.py
+from sqlalchemy import BigInteger, Column, Integer, String
+from models.base import Base
+
+
+class MapConfig(Base):
+    __tablename__ = "map_configs"
+    id = Column(Integer, primary_key=True)
+    server_id = Column(String, unique=True, nullable=False)
+    seed = Column(BigInteger, nullable=False)
+    version = Column(String, nullable=False, default="MC_NEWEST")
@@ -1,11 +1,10 @@
-from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import Column, Integer, String
-
-Base = declarative_base()
+from models.base import Base
 
 
 class ServerConfig(Base):
     __tablename__ = "server_configs"
     id = Column(Integer, primary_key=True)
     server_id = Column(String, unique=True)
-    prefix = Column(String, default="!")
+    # No default here, unset prefixes resolve to PrefixCache.default
+    prefix = Column(String)
@@ -1,10 +1,6 @@
 # models/waypoint.py
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, ForeignKey
-from sqlalchemy.orm import relationship
-from models.coordinate import Coordinate
-
-Base = declarative_base()
+from sqlalchemy import Column, DateTime, Index, Integer, String, func
+from models.base import Base
 
 
 class Waypoint(Base):
@@ -16,6 +12,19 @@ class Waypoint(Base):
     visibility = Column(Integer, nullable=False)
     dimension = Column(String, nullable=False)
     file = Column(String, nullable=False)
-    coordinate_id = Column(Integer, ForeignKey("coordinates.id"), nullable=False)
+    guild_id = Column(String, nullable=True)
+    x = Column(Integer, nullable=False)
+    y = Column(Integer, nullable=False)
+    z = Column(Integer, nullable=False)
+    # Identifies reshares of the same waypoint, see waypoint_fingerprint
+    fingerprint = Column(String, nullable=False)
+    share_count = Column(Integer, nullable=False, default=1, server_default="1")
+    last_seen = Column(
+        DateTime, nullable=False, server_default=func.current_timestamp()
+    )
 
-    coordinate = relationship("Coordinate", back_populates="waypoints")
+    __table_args__ = (
+        Index("ix_waypoints_guild_dimension_x_z", "guild_id", "dimension", "x", "z"),
+        Index("ix_waypoints_guild_name", "guild_id", "name"),
+        Index("ix_waypoints_fingerprint", "fingerprint", unique=True),
+    )
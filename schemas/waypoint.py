@@ -1,22 +1,17 @@
 # schemas/waypoint.py
-from pydantic import BaseModel, Field, field_validator
+import hashlib
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, Field, computed_field, field_validator
+from waypoint_mapper.cubiomes_wrapper import Dimension
 
 
-class CoordinateBase(BaseModel):
-    x: int
-    y: int
-    z: int
-
-
-class CoordinateCreate(CoordinateBase):
-    pass
-
-
-class Coordinate(CoordinateBase):
-    id: int
-
-    class Config:
-        orm_mode = True
+def waypoint_fingerprint(guild_id, name, dimension, x, y, z, color):
+    """Hash the fields that make two shared waypoints the same waypoint."""
+    key = "\x1f".join(
+        str(value) for value in (guild_id or "", name, dimension, x, y, z, color)
+    )
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
 
 
 class WaypointBase(BaseModel):
@@ -26,15 +21,38 @@ class WaypointBase(BaseModel):
     visibility: bool
     dimension: str
     file: str
+    x: int
+    y: int
+    z: int
+    guild_id: Optional[str] = None
+
+    @field_validator("dimension")
+    @classmethod
+    def normalize_dimension(cls, value: str) -> str:
+        # Chat shares Xaero's container key and files their dim%<n> directory,
+        # both are stored as "overworld", "nether" or "end"
+        return Dimension.from_xaero(value).name.lower()
 
 
 class WaypointCreate(WaypointBase):
-    coordinate_id: int
+    @computed_field
+    @property
+    def fingerprint(self) -> str:
+        return waypoint_fingerprint(
+            self.guild_id,
+            self.name,
+            self.dimension,
+            self.x,
+            self.y,
+            self.z,
+            self.color,
+        )
 
 
 class Waypoint(WaypointBase):
     id: int
-    coordinate: Coordinate
+    share_count: int
+    last_seen: datetime
 
     class Config:
         orm_mode = True
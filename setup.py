@@ -0,0 +1,33 @@
+# setup.py
+# Builds the native cubiomes extension used by waypoint_mapper:
+#     python setup.py build_ext --inplace
+# Without it, waypoint_mapper falls back to the ctypes wrapper library built
+# by compile_wrapper.bat / compile_wrapper.sh.
+import sys
+from setuptools import setup, Extension
+
+CUBIOMES_DIR = "waypoint_mapper/cubiomes"
+CUBIOMES_SOURCES = [
+    "biomenoise.c",
+    "generator.c",
+    "layers.c",
+    "util.c",
+    "noise.c",
+    "quadbase.c",
+    "biometree.c",
+    "finders.c",
+]
+
+cubiomes_extension = Extension(
+    "waypoint_mapper._cubiomes",
+    sources=["waypoint_mapper/_cubiomes.c", "waypoint_mapper/cubiomes_wrapper.c"]
+    + [f"{CUBIOMES_DIR}/{source}" for source in CUBIOMES_SOURCES],
+    include_dirs=[CUBIOMES_DIR],
+    extra_compile_args=[] if sys.platform == "win32" else ["-O3", "-fwrapv"],
+    libraries=[] if sys.platform == "win32" else ["m"],
+)
+
+setup(
+    name="waypoint-wizard",
+    ext_modules=[cubiomes_extension],
+)
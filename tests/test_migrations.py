@@ -0,0 +1,205 @@
+import sqlite3
+import pytest
+from sqlalchemy import create_engine
+from database import migrations
+from database.migrations import MIGRATIONS, RTREE_BACKFILL, migrate
+from models import map_config, server_config, waypoint
+from models.base import Base
+
+# The schema every database had before database.migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE coordinates (
+    id INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL,
+    z INTEGER NOT NULL, PRIMARY KEY (id)
+);
+CREATE TABLE waypoints (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL, type VARCHAR NOT NULL,
+    color INTEGER NOT NULL, visibility INTEGER NOT NULL,
+    dimension VARCHAR NOT NULL, file VARCHAR NOT NULL,
+    coordinate_id INTEGER NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(coordinate_id) REFERENCES coordinates (id)
+);
+CREATE TABLE server_configs (
+    id INTEGER NOT NULL, server_id VARCHAR, prefix VARCHAR,
+    PRIMARY KEY (id), UNIQUE (server_id)
+);
+"""
+
+
+def _migrate(path):
+    engine = create_engine(f"sqlite:///{path}")
+    migrate(engine, Base.metadata)
+    engine.dispose()
+    return sqlite3.connect(path)
+
+
+def _schema(connection, table):
+    return connection.execute(f"PRAGMA table_info({table})").fetchall()
+
+
+def _objects(connection):
+    """Return every index and trigger with whitespace-insensitive SQL."""
+    rows = connection.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type IN ('index', 'trigger')"
+    )
+    return {name: " ".join((sql or "").split()) for name, sql in rows}
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    path = tmp_path / "bot.db"
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA)
+    connection.executemany(
+        "INSERT INTO coordinates VALUES (?, ?, ?, ?)",
+        [
+            (1, 100, 64, -200),
+            (2, 100, 64, -200),
+            (3, -5, 70, 9),
+            (4, 7, 1, 7),
+            (5, 100, 64, -200),
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO waypoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            # Shared twice, so folded into one row
+            (1, "Home", "H", 6, 1, "Internal-overworld-waypoints", "f", 1),
+            (2, "Home", "H", 6, 1, "Internal-overworld-waypoints", "f", 2),
+            (3, "Hub", "N", 12, 0, "Internal-the-nether-waypoints", "f", 3),
+            (4, "Gate", "G", 2, 1, "Internal-the-end-waypoints", "f", 4),
+            # Imported from a file, the same waypoint under another name
+            (5, "Home", "H", 6, 1, "dim%0", "f", 5),
+        ],
+    )
+    connection.commit()
+    connection.close()
+    return path
+
+
+def test_upgrades_baseline_database(baseline):
+    connection = _migrate(baseline)
+
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    tables = {
+        row[0]
+        for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'"
+        )
+    }
+    assert "coordinates" not in tables
+
+    rows = connection.execute(
+        "SELECT id, name, dimension, x, y, z, share_count FROM waypoints ORDER BY id"
+    ).fetchall()
+    assert rows == [
+        (1, "Home", "overworld", 100, 64, -200, 3),
+        (3, "Hub", "nether", -5, 70, 9, 1),
+        (4, "Gate", "end", 7, 1, 7, 1),
+    ]
+    assert connection.execute(
+        "SELECT COUNT(*) FROM waypoints WHERE fingerprint IS NULL OR last_seen IS NULL"
+    ).fetchone() == (0,)
+
+    entries = connection.execute(
+        "SELECT id, min_x, min_z, dimension FROM waypoint_rtree ORDER BY id"
+    ).fetchall()
+    assert entries == [(1, 100.0, -200.0, 0), (3, -5.0, 9.0, -1), (4, 7.0, 7.0, 1)]
+
+
+def test_migrated_schema_matches_new_database(baseline, tmp_path):
+    migrated = _migrate(baseline)
+    new = _migrate(tmp_path / "new.db")
+    assert _schema(migrated, "waypoints") == _schema(new, "waypoints")
+
+    assert _objects(migrated) == _objects(new)
+
+
+def test_triggers_keep_rtree_in_sync(baseline):
+    connection = _migrate(baseline)
+    connection.execute("UPDATE waypoints SET x = 500 WHERE id = 3")
+    connection.execute("DELETE FROM waypoints WHERE id = 4")
+    connection.commit()
+    assert connection.execute(
+        "SELECT id, min_x FROM waypoint_rtree ORDER BY id"
+    ).fetchall() == [(1, 100.0), (3, 500.0)]
+
+
+def test_interrupted_migration_rolls_back(baseline, monkeypatch):
+    def crash(connection):
+        connection.exec_driver_sql("CREATE TABLE waypoints_new (id INTEGER)")
+        raise RuntimeError("crashed")
+
+    monkeypatch.setattr(
+        migrations, "MIGRATIONS", [MIGRATIONS[0], crash, *MIGRATIONS[2:]]
+    )
+    with pytest.raises(RuntimeError):
+        _migrate(baseline)
+    connection = sqlite3.connect(baseline)
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == 1
+    assert (
+        connection.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'waypoints_new'"
+        ).fetchall()
+        == []
+    )
+    connection.close()
+
+    monkeypatch.undo()
+    connection = _migrate(baseline)
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+
+
+def test_interrupted_normalization_keeps_fingerprint_index(baseline, monkeypatch):
+    def crash(connection):
+        connection.exec_driver_sql("DROP INDEX ix_waypoints_fingerprint")
+        raise RuntimeError("crashed")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [*MIGRATIONS[:3], crash])
+    with pytest.raises(RuntimeError):
+        _migrate(baseline)
+    connection = sqlite3.connect(baseline)
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == 3
+    assert "ix_waypoints_fingerprint" in _objects(connection)
+    connection.close()
+
+    monkeypatch.undo()
+    connection = _migrate(baseline)
+    assert "ix_waypoints_fingerprint" in _objects(connection)
+
+
+def test_interrupted_spatial_index_leaves_nothing(baseline, monkeypatch):
+    def crash(connection):
+        migrations.add_spatial_index(connection)
+        raise RuntimeError("crashed")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [crash, *MIGRATIONS[1:]])
+    with pytest.raises(RuntimeError):
+        _migrate(baseline)
+    connection = sqlite3.connect(baseline)
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == 0
+    assert "guild_id" not in {column[1] for column in _schema(connection, "waypoints")}
+    assert not [name for name in _objects(connection) if "rtree" in name]
+    assert (
+        connection.execute(
+            "SELECT name FROM sqlite_master WHERE name LIKE 'waypoint_rtree%'"
+        ).fetchall()
+        == []
+    )
+
+
+def test_deferred_inserts_are_indexed_by_backfill(tmp_path):
+    connection = _migrate(tmp_path / "new.db")
+    insert = """INSERT INTO waypoints
+        (name, type, color, visibility, dimension, file, x, y, z, fingerprint)
+        VALUES (?, 'W', 0, 1, ?, 'f', ?, 64, ?, ?)"""
+    connection.execute("INSERT INTO waypoint_rtree_defer VALUES (1)")
+    connection.execute(insert, ("A", "nether", 1, 2, "a"))
+    assert connection.execute("SELECT COUNT(*) FROM waypoint_rtree").fetchone() == (0,)
+    connection.execute(RTREE_BACKFILL.replace(":last_id", "0"))
+    connection.execute("DELETE FROM waypoint_rtree_defer")
+    connection.execute(insert, ("B", "overworld", 3, 4, "b"))
+    connection.commit()
+    assert connection.execute(
+        "SELECT id, min_x, min_z, dimension FROM waypoint_rtree ORDER BY id"
+    ).fetchall() == [(1, 1.0, 2.0, -1), (2, 3.0, 4.0, 0)]
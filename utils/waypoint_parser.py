@@ -0,0 +1,75 @@
+import re
+from typing import List
+from pydantic import TypeAdapter, ValidationError
+from schemas.waypoint import WaypointCreate
+
+WAYPOINT_PREFIX = "xaero-waypoint:"
+
+# Xaero writes "~" for waypoints saved without a height
+DEFAULT_Y = 64
+
+# xaero-waypoint:name:initials:x:y:z:color:rotate:yaw:dimension, with the
+# numeric fields and dimension tight enough that several waypoints pasted
+# into one message are matched separately
+WAYPOINT_PATTERN = re.compile(
+    r"xaero-waypoint:([^:\n]+):([^:\n]+):(-?\d+):(-?\d+|~):(-?\d+):(\d+)"
+    r":(true|false):(-?\d+):([^:\s]+)"
+)
+
+_waypoint_list = TypeAdapter(List[WaypointCreate])
+
+
+def validate_waypoints(rows):
+    """Validate a batch of waypoint dicts at once.
+
+    Args:
+        rows (list): WaypointCreate fields per waypoint.
+
+    Returns:
+        tuple: The valid WaypointCreate models and the number rejected.
+    """
+    try:
+        return _waypoint_list.validate_python(rows), 0
+    except ValidationError as e:
+        invalid = {error["loc"][0] for error in e.errors()}
+    valid = [row for index, row in enumerate(rows) if index not in invalid]
+    return _waypoint_list.validate_python(valid), len(invalid)
+
+
+def parse_waypoints(content, guild_id=None, file="default_file"):
+    """Find every waypoint shared in a chat message.
+
+    Args:
+        content (str): The message text.
+        guild_id (str): The guild the message was sent in.
+        file (str): The file name stored with each waypoint.
+
+    Returns:
+        tuple: The valid WaypointCreate models and the number rejected.
+    """
+    # Nearly every message has no waypoint, skip those before any regex runs
+    if WAYPOINT_PREFIX not in content:
+        return [], 0
+
+    rows = [
+        {
+            # Xaero escapes colons in shared names as "^col^"
+            "name": match[1].replace("^col^", ":"),
+            "type": match[2],
+            "x": match[3],
+            "y": DEFAULT_Y if match[4] == "~" else match[4],
+            "z": match[5],
+            "color": match[6],
+            # The boolean before the yaw is rotate-on-teleport, whether the
+            # waypoint is disabled is not shared, so it is stored as enabled
+            # like the importer would
+            "visibility": True,
+            "dimension": match[9],
+            "file": file,
+            "guild_id": guild_id,
+        }
+        for match in WAYPOINT_PATTERN.finditer(content)
+    ]
+    if not rows:
+        return [], 0
+    return validate_waypoints(rows)
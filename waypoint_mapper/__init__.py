@@ -4,5 +4,15 @@ from .cubiomes_wrapper import (
     Dimension,
     Flags,
     Colors,
+    StructureType,
 )
+from .tile_cache import TileCache
+from .pyramid import ZoomPyramid, NATIVE_SCALES
+from .markers import MapMarker, markers_from_waypoints
 from .map_generator import MapGenerator
+from .render_pool import RenderPool
+from .structures import StructureIndex
+from .biome_search import BiomeSearch
+from .prewarm import PrewarmScheduler
+from .encoder import MapEncoder, EncodedMapCache, encode_image, render_key
+from .metrics import MetricsSink, HistogramSink, RenderTimings
@@ -0,0 +1,273 @@
+/*
+ * Native CPython bindings for cubiomes_wrapper.c.
+ *
+ * Exposes the same functions as the ctypes backend in cubiomes_wrapper.py,
+ * taking typed arguments and buffer-protocol objects directly, and releases
+ * the GIL for the duration of every generation call so threaded renders run
+ * in parallel.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <limits.h>
+#include "cubiomes_wrapper.h"
+
+#define GENERATOR_CAPSULE "waypoint_mapper._cubiomes.Generator"
+
+static void generator_capsule_destructor(PyObject *capsule)
+{
+    Generator *g = (Generator *)PyCapsule_GetPointer(capsule, GENERATOR_CAPSULE);
+    if (g != NULL)
+        free_generator(g);
+}
+
+static Generator *get_generator(PyObject *capsule)
+{
+    if (!PyCapsule_IsValid(capsule, GENERATOR_CAPSULE))
+    {
+        PyErr_SetString(PyExc_TypeError, "expected a generator from create_generator()");
+        return NULL;
+    }
+    /* free_generator() marks freed capsules by setting their context */
+    if (PyCapsule_GetContext(capsule) != NULL)
+    {
+        PyErr_SetString(PyExc_ValueError, "generator has already been freed");
+        return NULL;
+    }
+    return (Generator *)PyCapsule_GetPointer(capsule, GENERATOR_CAPSULE);
+}
+
+static int buffer_length(Py_buffer *view, size_t item_size)
+{
+    Py_ssize_t length = view->len / (Py_ssize_t)item_size;
+    return length > INT_MAX ? INT_MAX : (int)length;
+}
+
+static PyObject *py_create_generator(PyObject *self, PyObject *args)
+{
+    int version, dimension;
+    unsigned int flags;
+    unsigned long long seed;
+    if (!PyArg_ParseTuple(args, "iIKi", &version, &flags, &seed, &dimension))
+        return NULL;
+
+    Generator *g;
+    Py_BEGIN_ALLOW_THREADS
+    g = create_generator(version, flags, (uint64_t)seed, dimension);
+    Py_END_ALLOW_THREADS
+    if (g == NULL)
+        return PyErr_NoMemory();
+
+    PyObject *capsule = PyCapsule_New(g, GENERATOR_CAPSULE, generator_capsule_destructor);
+    if (capsule == NULL)
+        free_generator(g);
+    return capsule;
+}
+
+static PyObject *py_free_generator(PyObject *self, PyObject *capsule)
+{
+    Generator *g = get_generator(capsule);
+    if (g == NULL)
+        return NULL;
+    if (PyCapsule_SetDestructor(capsule, NULL) != 0 ||
+        PyCapsule_SetContext(capsule, capsule) != 0)
+        return NULL;
+    free_generator(g);
+    Py_RETURN_NONE;
+}
+
+static PyObject *py_get_image_size(PyObject *self, PyObject *args)
+{
+    int sx, sz, pix4cell;
+    if (!PyArg_ParseTuple(args, "iii", &sx, &sz, &pix4cell))
+        return NULL;
+    return PyLong_FromLong(get_image_size(sx, sz, pix4cell));
+}
+
+static PyObject *py_get_biome_grid_size(PyObject *self, PyObject *args)
+{
+    int version, scale, sx, sy, sz;
+    unsigned int flags;
+    if (!PyArg_ParseTuple(args, "iIiiii", &version, &flags, &scale, &sx, &sy, &sz))
+        return NULL;
+    return PyLong_FromLong(get_biome_grid_size(version, flags, scale, sx, sy, sz));
+}
+
+static PyObject *py_get_biome_colors(PyObject *self, PyObject *args)
+{
+    Py_buffer view;
+    if (!PyArg_ParseTuple(args, "w*", &view))
+        return NULL;
+    if (view.len < 256 * 3)
+    {
+        PyBuffer_Release(&view);
+        PyErr_SetString(PyExc_ValueError, "biome color buffer must hold 256 * 3 bytes");
+        return NULL;
+    }
+    get_biome_colors((unsigned char *)view.buf);
+    PyBuffer_Release(&view);
+    Py_RETURN_NONE;
+}
+
+static PyObject *py_biome_grid_to_image(PyObject *self, PyObject *args)
+{
+    Py_buffer ids, out;
+    int sx, sz, pix4cell;
+    if (!PyArg_ParseTuple(args, "y*iiiw*", &ids, &sx, &sz, &pix4cell, &out))
+        return NULL;
+
+    int result = -1;
+    if (buffer_length(&ids, sizeof(int)) >= sx * sz)
+    {
+        Py_BEGIN_ALLOW_THREADS
+        result = biome_grid_to_image((const int *)ids.buf, sx, sz, pix4cell,
+                                     (unsigned char *)out.buf, buffer_length(&out, 1));
+        Py_END_ALLOW_THREADS
+    }
+    PyBuffer_Release(&ids);
+    PyBuffer_Release(&out);
+    return PyLong_FromLong(result);
+}
+
+static PyObject *py_generator_biome_image(PyObject *self, PyObject *args)
+{
+    PyObject *capsule;
+    int x, z, sx, sz, y, sy, pix4cell, scale;
+    Py_buffer out;
+    if (!PyArg_ParseTuple(args, "Oiiiiiiiiw*", &capsule, &x, &z, &sx, &sz, &y, &sy,
+                          &pix4cell, &scale, &out))
+        return NULL;
+
+    Generator *g = get_generator(capsule);
+    if (g == NULL)
+    {
+        PyBuffer_Release(&out);
+        return NULL;
+    }
+
+    int result;
+    Py_BEGIN_ALLOW_THREADS
+    result = generator_biome_image(g, x, z, sx, sz, y, sy, pix4cell, scale,
+                                   (unsigned char *)out.buf, buffer_length(&out, 1));
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&out);
+    return PyLong_FromLong(result);
+}
+
+static PyObject *py_generator_biome_grid(PyObject *self, PyObject *args)
+{
+    PyObject *capsule;
+    int x, z, sx, sz, y, sy, scale;
+    Py_buffer out;
+    if (!PyArg_ParseTuple(args, "Oiiiiiiiw*", &capsule, &x, &z, &sx, &sz, &y, &sy,
+                          &scale, &out))
+        return NULL;
+
+    Generator *g = get_generator(capsule);
+    if (g == NULL)
+    {
+        PyBuffer_Release(&out);
+        return NULL;
+    }
+
+    int result;
+    Py_BEGIN_ALLOW_THREADS
+    result = generator_biome_grid(g, x, z, sx, sz, y, sy, scale,
+                                  (int *)out.buf, buffer_length(&out, sizeof(int)));
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&out);
+    return PyLong_FromLong(result);
+}
+
+static PyObject *py_get_structure_region_size(PyObject *self, PyObject *args)
+{
+    int structure, version;
+    if (!PyArg_ParseTuple(args, "ii", &structure, &version))
+        return NULL;
+    return PyLong_FromLong(get_structure_region_size(structure, version));
+}
+
+static PyObject *py_generator_find_structures(PyObject *self, PyObject *args)
+{
+    PyObject *capsule;
+    int structure, reg_x0, reg_z0, reg_x1, reg_z1;
+    Py_buffer out;
+    if (!PyArg_ParseTuple(args, "Oiiiiiw*", &capsule, &structure, &reg_x0, &reg_z0,
+                          &reg_x1, &reg_z1, &out))
+        return NULL;
+
+    Generator *g = get_generator(capsule);
+    if (g == NULL)
+    {
+        PyBuffer_Release(&out);
+        return NULL;
+    }
+
+    int result;
+    Py_BEGIN_ALLOW_THREADS
+    result = generator_find_structures(g, structure, reg_x0, reg_z0, reg_x1, reg_z1,
+                                       (int *)out.buf, buffer_length(&out, 2 * sizeof(int)));
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&out);
+    return PyLong_FromLong(result);
+}
+
+static PyObject *py_generator_find_strongholds(PyObject *self, PyObject *args)
+{
+    PyObject *capsule;
+    Py_buffer out;
+    if (!PyArg_ParseTuple(args, "Ow*", &capsule, &out))
+        return NULL;
+
+    Generator *g = get_generator(capsule);
+    if (g == NULL)
+    {
+        PyBuffer_Release(&out);
+        return NULL;
+    }
+
+    int result;
+    Py_BEGIN_ALLOW_THREADS
+    result = generator_find_strongholds(g, (int *)out.buf, buffer_length(&out, 2 * sizeof(int)));
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&out);
+    return PyLong_FromLong(result);
+}
+
+static PyMethodDef cubiomes_methods[] = {
+    {"create_generator", py_create_generator, METH_VARARGS,
+     "create_generator(version, flags, seed, dimension) -> generator"},
+    {"free_generator", py_free_generator, METH_O,
+     "free_generator(generator)"},
+    {"get_image_size", py_get_image_size, METH_VARARGS,
+     "get_image_size(sx, sz, pix4cell) -> int"},
+    {"get_biome_grid_size", py_get_biome_grid_size, METH_VARARGS,
+     "get_biome_grid_size(version, flags, scale, sx, sy, sz) -> int"},
+    {"get_biome_colors", py_get_biome_colors, METH_VARARGS,
+     "get_biome_colors(buffer)"},
+    {"biome_grid_to_image", py_biome_grid_to_image, METH_VARARGS,
+     "biome_grid_to_image(ids, sx, sz, pix4cell, buffer) -> int"},
+    {"generator_biome_image", py_generator_biome_image, METH_VARARGS,
+     "generator_biome_image(generator, x, z, sx, sz, y, sy, pix4cell, scale, buffer) -> int"},
+    {"generator_biome_grid", py_generator_biome_grid, METH_VARARGS,
+     "generator_biome_grid(generator, x, z, sx, sz, y, sy, scale, buffer) -> int"},
+    {"get_structure_region_size", py_get_structure_region_size, METH_VARARGS,
+     "get_structure_region_size(structure, version) -> int"},
+    {"generator_find_structures", py_generator_find_structures, METH_VARARGS,
+     "generator_find_structures(generator, structure, reg_x0, reg_z0, reg_x1, reg_z1, buffer) -> int"},
+    {"generator_find_strongholds", py_generator_find_strongholds, METH_VARARGS,
+     "generator_find_strongholds(generator, buffer) -> int"},
+    {NULL, NULL, 0, NULL},
+};
+
+static struct PyModuleDef cubiomes_module = {
+    PyModuleDef_HEAD_INIT,
+    "_cubiomes",
+    "Native bindings for the cubiomes wrapper.",
+    -1,
+    cubiomes_methods,
+};
+
+PyMODINIT_FUNC PyInit__cubiomes(void)
+{
+    return PyModule_Create(&cubiomes_module);
+}
@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from waypoint_mapper.cubiomes_wrapper import CubiomesWrapper
+from waypoint_mapper.rings import ring_cells
+from waypoint_mapper.tile_cache import sample_y
+
+CONFIRM_SCALE = 4  # The finest scale a match is confirmed at
+SEARCH_SCALES = (64, 16, CONFIRM_SCALE)
+
+# The CubiomesWrapper of the current worker process, created once by _init_worker
+_worker_cubiomes = None
+
+
+def _init_worker(dll_path):
+    global _worker_cubiomes
+    _worker_cubiomes = CubiomesWrapper(dll_path)
+
+
+def _cell_distance(x, z, cell_x, cell_z, scale):
+    """Return the distance from block (x, z) to the closest block of a cell."""
+    dx = max(cell_x * scale - x, 0, x - (cell_x + 1) * scale + 1)
+    dz = max(cell_z * scale - z, 0, z - (cell_z + 1) * scale + 1)
+    return math.hypot(dx, dz)
+
+
+def _search_tile(
+    version, flags, seed, dimension, biomes, x, z, tile_x, tile_z, tile_size, bound
+):
+    """Find the matching 1:4 cell closest to (x, z) within one tile.
+
+    The tile is generated at the coarsest scale and every matching cell,
+    plus its neighbours to catch biomes the coarse sample missed, is queued
+    by its distance to (x, z). Queued cells are refined one scale at a time
+    in distance order, so the first cell confirmed at 1:4 is the nearest
+    and cells farther than bound are never generated.
+    """
+    cubiomes = _worker_cubiomes
+    biomes = np.asarray(biomes, dtype=np.intc)
+    coarse = SEARCH_SCALES[0]
+    cells = tile_size // coarse
+
+    grid = cubiomes.generate_biome_grid(
+        version,
+        flags,
+        seed,
+        dimension,
+        tile_x * cells,
+        tile_z * cells,
+        cells,
+        cells,
+        sample_y(coarse),
+        1,
+        coarse,
+    )
+    matches = np.isin(grid, biomes)
+    near = matches.copy()
+    near[1:, :] |= matches[:-1, :]
+    near[:-1, :] |= matches[1:, :]
+    near[:, 1:] |= matches[:, :-1]
+    near[:, :-1] |= matches[:, 1:]
+
+    queue = []
+    for row, column in zip(*np.nonzero(near)):
+        cell_x, cell_z = tile_x * cells + int(column), tile_z * cells + int(row)
+        distance = _cell_distance(x, z, cell_x, cell_z, coarse)
+        if distance <= bound:
+            queue.append((distance, 0, cell_x, cell_z))
+    heapq.heapify(queue)
+
+    while queue:
+        distance, level, cell_x, cell_z = heapq.heappop(queue)
+        if distance > bound:
+            break
+        if SEARCH_SCALES[level] == CONFIRM_SCALE:
+            center_x = cell_x * CONFIRM_SCALE + CONFIRM_SCALE // 2
+            center_z = cell_z * CONFIRM_SCALE + CONFIRM_SCALE // 2
+            return (center_x, center_z), math.hypot(center_x - x, center_z - z)
+
+        scale = SEARCH_SCALES[level]
+        finer = SEARCH_SCALES[level + 1]
+        ratio = scale // finer
+        grid = cubiomes.generate_biome_grid(
+            version,
+            flags,
+            seed,
+            dimension,
+            cell_x * ratio,
+            cell_z * ratio,
+            ratio,
+            ratio,
+            sample_y(finer),
+            1,
+            finer,
+        )
+        for row, column in zip(*np.nonzero(np.isin(grid, biomes))):
+            sub_x, sub_z = cell_x * ratio + int(column), cell_z * ratio + int(row)
+            heapq.heappush(
+                queue,
+                (_cell_distance(x, z, sub_x, sub_z, finer), level + 1, sub_x, sub_z),
+            )
+    return None
+
+
+class BiomeSearch:
+    """Finds the nearest biome to a block across worker processes.
+
+    The world is split into square tiles that are searched in rings around
+    the starting point, one ring at a time with every tile of a ring in its
+    own worker. Each tile is filtered at 1:64 and 1:16 before matches are
+    confirmed at 1:4, so only the neighbourhood of candidate cells is ever
+    generated at fine scales. Biomes small enough to fall between the 1:64
+    samples of a tile and its neighbours can be missed.
+    """
+
+    def __init__(
+        self,
+        dll_path: str = None,
+        max_workers: int = None,
+        tile_size: int = 4096,
+        mp_context=None,
+    ):
+        if tile_size % SEARCH_SCALES[0]:
+            raise ValueError(f"Tile size must be a multiple of {SEARCH_SCALES[0]}")
+        self.tile_size = tile_size
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(dll_path,),
+        )
+
+    def find_nearest(
+        self, biomes, x, z, dimension, seed, version, flags, max_distance=20000
+    ):
+        """Find the nearest block position in any of the given biomes.
+
+        Args:
+            biomes (int or list): Cubiomes biome IDs to look for.
+            x (int): The block x to search from.
+            z (int): The block z to search from.
+            max_distance (int): The search radius in blocks.
+
+        Returns:
+            tuple: The (x, z) center of the nearest matching 1:4 cell and its
+            distance, or None if there is none within max_distance.
+        """
+        if isinstance(biomes, int):
+            biomes = [biomes]
+        biomes = [int(biome) for biome in biomes]
+
+        size = self.tile_size
+        center_x, center_z = x // size, z // size
+        best = None
+        for ring in range(math.ceil(max_distance / size) + 1):
+            bound = max_distance if best is None else best[1]
+            futures = [
+                self._executor.submit(
+                    _search_tile,
+                    version.value,
+                    flags.value,
+                    seed,
+                    dimension.value,
+                    biomes,
+                    x,
+                    z,
+                    tile_x,
+                    tile_z,
+                    size,
+                    bound,
+                )
+                for tile_x, tile_z in ring_cells(center_x, center_z, ring)
+            ]
+            for future in futures:
+                found = future.result()
+                if found is not None and (best is None or found[1] < best[1]):
+                    best = found
+            # Every tile of the next ring is at least ring * size blocks away
+            if best is not None and best[1] <= ring * size:
+                break
+        return best
+
+    async def find_nearest_async(self, *args, **kwargs):
+        """Run find_nearest without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, lambda: self.find_nearest(*args, **kwargs)
+        )
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers, dropping any jobs that have not started."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,36 @@
+import numpy as np
+from PIL import Image
+
+
+def upscale_grid(grid, pix4cell):
+    """Repeat every cell of a 2D grid into a pix4cell by pix4cell block."""
+    if pix4cell == 1:
+        return grid
+    sz, sx = grid.shape
+    # Broadcasting gives a stride-0 view; the reshape makes the only copy
+    blocks = np.broadcast_to(grid[:, None, :, None], (sz, pix4cell, sx, pix4cell))
+    return blocks.reshape(sz * pix4cell, sx * pix4cell)
+
+
+def colorize_biome_grid(grid, palette, pix4cell=1):
+    """Map a 2D grid of biome IDs to an RGB array through a palette.
+
+    Args:
+        grid (numpy.ndarray): Biome IDs of shape (sz, sx). IDs wrap around the
+            palette, so the -1 "no biome" marker uses the last entry.
+        palette (numpy.ndarray): A (256, 3) uint8 lookup table.
+        pix4cell (int): The number of pixels per cell along each axis.
+
+    Returns:
+        numpy.ndarray: A contiguous uint8 array of shape (sz * pix4cell, sx * pix4cell, 3).
+    """
+    # Upscale the one-byte IDs before the lookup so the LUT runs once per pixel
+    ids = upscale_grid(np.asarray(grid), pix4cell)
+    return np.take(palette, ids, axis=0, mode="wrap")
+
+
+def biome_grid_image(grid, palette, pix4cell=1):
+    """Build an RGB PIL image of a biome ID grid without an intermediate encoding."""
+    rgb = colorize_biome_grid(grid, palette, pix4cell)
+    height, width, _ = rgb.shape
+    return Image.frombuffer("RGB", (width, height), rgb, "raw", "RGB", 0, 1)
@@ -0,0 +1,12 @@
+#!/bin/sh
+# Change directory to the location of this script
+cd "$(dirname "$0")" || exit 1
+
+# Compile the cubiomes wrapper shared library
+if gcc -shared -fPIC -O3 -fwrapv -o libcubiomes_wrapper.so -I./cubiomes cubiomes_wrapper.c ./cubiomes/biomenoise.c ./cubiomes/generator.c ./cubiomes/layers.c ./cubiomes/util.c ./cubiomes/noise.c ./cubiomes/quadbase.c ./cubiomes/biometree.c ./cubiomes/finders.c -lm; then
+    echo "Compilation successful."
+else
+    status=$?
+    echo "Compilation failed."
+    exit $status
+fi
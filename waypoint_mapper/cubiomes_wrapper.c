@@ -2,6 +2,7 @@
 #include <stdlib.h>
 #include <stdint.h>
 #include "../cubiomes/generator.h"
+#include "../cubiomes/finders.h"
 #include "../cubiomes/util.h"
 #include "../cubiomes/biomenoise.h"
 #include "../cubiomes/tables/btree18.h"
@@ -9,15 +10,130 @@
 #include "../cubiomes/tables/btree19.h"
 #include "../cubiomes/tables/btree20.h"
 
-static unsigned char *image_buffer = NULL;
-static int image_size = 0;
+#define PPM_HEADER "P6\n%d %d\n255\n"
 
-void generate_biome_image(int version, uint32_t flags, uint64_t seed, int dimension,
-                          int x, int z, int sx, int sz, int y, int sy, int pix4cell, int scale)
+int get_image_size(int sx, int sz, int pix4cell)
 {
+    int imgWidth = pix4cell * sx, imgHeight = pix4cell * sz;
+    int header_len = snprintf(NULL, 0, PPM_HEADER, imgWidth, imgHeight);
+    return header_len + 3 * imgWidth * imgHeight;
+}
+
+/*
+ * Copies the default cubiomes biome colors into a caller-owned buffer of
+ * 256 * 3 bytes, one RGB triple per biome ID.
+ */
+void get_biome_colors(unsigned char *buffer)
+{
+    initBiomeColors((unsigned char(*)[3])buffer);
+}
+
+/*
+ * Colors an sx by sz grid of biome IDs into a PPM image in a caller-owned
+ * buffer. Returns the number of bytes written or -1 if the buffer is too
+ * small.
+ */
+int biome_grid_to_image(const int *biomeIds, int sx, int sz, int pix4cell,
+                        unsigned char *buffer, int buffer_size)
+{
+    int image_size = get_image_size(sx, sz, pix4cell);
+    if (biomeIds == NULL || buffer == NULL || buffer_size < image_size)
+        return -1;
+
+    int imgWidth = pix4cell * sx, imgHeight = pix4cell * sz;
+    unsigned char biomeColors[256][3];
+    initBiomeColors(biomeColors);
+    int header_len = sprintf((char *)buffer, PPM_HEADER, imgWidth, imgHeight);
+    biomesToImage(buffer + header_len, biomeColors, biomeIds, sx, sz, pix4cell, 2);
+    return image_size;
+}
+
+Generator *create_generator(int version, uint32_t flags, uint64_t seed, int dimension)
+{
+    Generator *g = (Generator *)malloc(sizeof(Generator));
+    if (g == NULL)
+        return NULL;
+    setupGenerator(g, version, flags);
+    applySeed(g, dimension, seed);
+    return g;
+}
+
+void free_generator(Generator *g)
+{
+    free(g);
+}
+
+/*
+ * Renders a PPM image of the requested area into a caller-owned buffer
+ * using an already seeded generator. The generator is only read, and
+ * nothing is kept between calls, so concurrent calls are safe as long as
+ * each one is given its own buffer.
+ *
+ * Returns the number of bytes written, -1 if the buffer is too small,
+ * -2 if the biome cache could not be allocated or -3 if generation failed.
+ */
+int generator_biome_image(const Generator *g, int x, int z, int sx, int sz, int y, int sy,
+                          int pix4cell, int scale, unsigned char *buffer, int buffer_size)
+{
+    int image_size = get_image_size(sx, sz, pix4cell);
+    if (buffer == NULL || buffer_size < image_size)
+        return -1;
+
+    Range r;
+    r.scale = scale;
+    r.x = x, r.z = z;
+    r.sx = sx, r.sz = sz;
+    r.y = y, r.sy = sy;
+
+    int *biomeIds = allocCache(g, r);
+    if (biomeIds == NULL)
+        return -2;
+    if (genBiomes(g, biomeIds, r) != 0)
+    {
+        free(biomeIds);
+        return -3;
+    }
+
+    biome_grid_to_image(biomeIds, r.sx, r.sz, pix4cell, buffer, buffer_size);
+
+    free(biomeIds);
+    return image_size;
+}
+
+int generate_biome_image(int version, uint32_t flags, uint64_t seed, int dimension,
+                         int x, int z, int sx, int sz, int y, int sy, int pix4cell, int scale,
+                         unsigned char *buffer, int buffer_size)
+{
+    if (buffer == NULL || buffer_size < get_image_size(sx, sz, pix4cell))
+        return -1;
+
     Generator g;
     setupGenerator(&g, version, flags);
     applySeed(&g, dimension, seed);
+    return generator_biome_image(&g, x, z, sx, sz, y, sy, pix4cell, scale, buffer, buffer_size);
+}
+
+int get_biome_grid_size(int version, uint32_t flags, int scale, int sx, int sy, int sz)
+{
+    Generator g;
+    setupGenerator(&g, version, flags);
+    return (int)getMinCacheSize(&g, scale, sx, sy, sz);
+}
+
+/*
+ * Generates the raw biome IDs of the requested area into a caller-owned
+ * int buffer of at least get_biome_grid_size() elements using an already
+ * seeded generator. The IDs are laid out as [sy][sz][sx]; any space past
+ * that is scratch used by genBiomes.
+ *
+ * Returns the number of IDs written, -1 if the buffer is too small or
+ * -3 if generation failed.
+ */
+int generator_biome_grid(const Generator *g, int x, int z, int sx, int sz, int y, int sy,
+                         int scale, int *buffer, int buffer_len)
+{
+    if (buffer == NULL || buffer_len < (int)getMinCacheSize(g, scale, sx, sy, sz))
+        return -1;
 
     Range r;
     r.scale = scale;
@@ -25,26 +141,87 @@ void generate_biome_image(int version, uint32_t flags, uint64_t seed, int dimens
     r.sx = sx, r.sz = sz;
     r.y = y, r.sy = sy;
 
-    int *biomeIds = allocCache(&g, r);
-    genBiomes(&g, biomeIds, r);
+    if (genBiomes(g, buffer, r) != 0)
+        return -3;
+    return sx * sz * (sy > 0 ? sy : 1);
+}
 
-    int imgWidth = pix4cell * r.sx, imgHeight = pix4cell * r.sz;
-    unsigned char biomeColors[256][3];
-    initBiomeColors(biomeColors);
-    image_size = 3 * imgWidth * imgHeight + 15 + snprintf(NULL, 0, "P6\n%d %d\n255\n", imgWidth, imgHeight);
-    image_buffer = (unsigned char *)malloc(image_size);
-    int header_len = sprintf((char *)image_buffer, "P6\n%d %d\n255\n", imgWidth, imgHeight);
-    biomesToImage(image_buffer + header_len, biomeColors, biomeIds, r.sx, r.sz, pix4cell, 2);
+int generate_biome_grid(int version, uint32_t flags, uint64_t seed, int dimension,
+                        int x, int z, int sx, int sz, int y, int sy, int scale,
+                        int *buffer, int buffer_len)
+{
+    Generator g;
+    setupGenerator(&g, version, flags);
+    if (buffer == NULL || buffer_len < (int)getMinCacheSize(&g, scale, sx, sy, sz))
+        return -1;
+    applySeed(&g, dimension, seed);
+    return generator_biome_grid(&g, x, z, sx, sz, y, sy, scale, buffer, buffer_len);
+}
 
-    free(biomeIds);
+/*
+ * Returns the size of a structure's placement regions in chunks, or -1 if
+ * the structure does not generate in this version.
+ */
+int get_structure_region_size(int structure, int version)
+{
+    StructureConfig sconf;
+    if (!getStructureConfig(structure, version, &sconf))
+        return -1;
+    return sconf.regionSize;
 }
 
-unsigned char *get_image_buffer()
+/*
+ * Finds the viable structure positions in the regions [reg_x0, reg_x1] by
+ * [reg_z0, reg_z1] using a generator seeded for the structure's dimension.
+ * Block x/z pairs are written to a caller-owned int buffer of at least
+ * 2 * max_positions elements.
+ *
+ * Returns the number of positions found or -1 if the buffer is too small.
+ */
+int generator_find_structures(Generator *g, int structure, int reg_x0, int reg_z0,
+                              int reg_x1, int reg_z1, int *buffer, int max_positions)
 {
-    return image_buffer;
+    int count = 0;
+    for (int reg_z = reg_z0; reg_z <= reg_z1; reg_z++)
+    {
+        for (int reg_x = reg_x0; reg_x <= reg_x1; reg_x++)
+        {
+            Pos pos;
+            if (!getStructurePos(structure, g->mc, g->seed, reg_x, reg_z, &pos))
+                continue;
+            if (!isViableStructurePos(structure, g, pos.x, pos.z, 0))
+                continue;
+            if (count >= max_positions)
+                return -1;
+            buffer[2 * count] = pos.x;
+            buffer[2 * count + 1] = pos.z;
+            count++;
+        }
+    }
+    return count;
 }
 
-int get_image_size()
+/*
+ * Finds the strongholds of a generator seeded for the overworld. Block x/z
+ * pairs are written to a caller-owned int buffer of at least
+ * 2 * max_positions elements.
+ *
+ * Returns the number of strongholds found.
+ */
+int generator_find_strongholds(Generator *g, int *buffer, int max_positions)
 {
-    return image_size;
+    StrongholdIter sh;
+    initFirstStronghold(&sh, g->mc, g->seed);
+
+    int count = 0;
+    while (count < max_positions)
+    {
+        int remaining = nextStronghold(&sh, g);
+        buffer[2 * count] = sh.pos.x;
+        buffer[2 * count + 1] = sh.pos.z;
+        count++;
+        if (remaining <= 0)
+            break;
+    }
+    return count;
 }
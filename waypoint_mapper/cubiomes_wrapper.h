@@ -2,9 +2,20 @@
 #define CUBIOMES_WRAPPER_H
 
 #include <stdint.h>
+#include "../cubiomes/generator.h"
 
-void generate_biome_image(int version, uint32_t flags, uint64_t seed, int dimension, int x, int z, int sx, int sz, int y, int sy, int pix4cell, int scale);
-unsigned char *get_image_buffer();
-int get_image_size();
+int get_image_size(int sx, int sz, int pix4cell);
+void get_biome_colors(unsigned char *buffer);
+int biome_grid_to_image(const int *biomeIds, int sx, int sz, int pix4cell, unsigned char *buffer, int buffer_size);
+Generator *create_generator(int version, uint32_t flags, uint64_t seed, int dimension);
+void free_generator(Generator *g);
+int generator_biome_image(const Generator *g, int x, int z, int sx, int sz, int y, int sy, int pix4cell, int scale, unsigned char *buffer, int buffer_size);
+int generate_biome_image(int version, uint32_t flags, uint64_t seed, int dimension, int x, int z, int sx, int sz, int y, int sy, int pix4cell, int scale, unsigned char *buffer, int buffer_size);
+int get_biome_grid_size(int version, uint32_t flags, int scale, int sx, int sy, int sz);
+int generator_biome_grid(const Generator *g, int x, int z, int sx, int sz, int y, int sy, int scale, int *buffer, int buffer_len);
+int generate_biome_grid(int version, uint32_t flags, uint64_t seed, int dimension, int x, int z, int sx, int sz, int y, int sy, int scale, int *buffer, int buffer_len);
+int get_structure_region_size(int structure, int version);
+int generator_find_structures(Generator *g, int structure, int reg_x0, int reg_z0, int reg_x1, int reg_z1, int *buffer, int max_positions);
+int generator_find_strongholds(Generator *g, int *buffer, int max_positions);
 
 #endif
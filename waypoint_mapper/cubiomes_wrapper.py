@@ -1,6 +1,12 @@
 import ctypes
-from ctypes import c_char_p, c_int, c_uint64, c_uint32, POINTER, c_ubyte, string_at
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from ctypes import c_int, c_uint64, c_uint32, c_void_p, POINTER, c_ubyte
 from enum import Enum, IntEnum
+import numpy as np
 
 
 class MinecraftVersion(IntEnum):
@@ -59,6 +65,16 @@ class Dimension(IntEnum):
     END = 1
     DIM_UNDEF = 1000
 
+    @classmethod
+    def from_xaero(cls, dimension: str):
+        """Map a Xaero waypoint dimension such as "Internal-the-nether-waypoints"."""
+        dimension = dimension.lower()
+        if "nether" in dimension or "dim%-1" in dimension:
+            return cls.NETHER
+        if "end" in dimension or "dim%1" in dimension:
+            return cls.END
+        return cls.OVERWORLD
+
 
 class Flags(IntEnum):
     DEFAULT = 0
@@ -75,45 +91,540 @@ class Colors(Enum):
     YELLOW = "yellow"
     BLACK = "black"
     WHITE = "white"
+    DARK_BLUE = "#0000aa"
+    DARK_GREEN = "#00aa00"
+    DARK_AQUA = "#00aaaa"
+    DARK_RED = "#aa0000"
+    DARK_PURPLE = "#aa00aa"
+    GOLD = "#ffaa00"
+    GRAY = "#aaaaaa"
+    DARK_GRAY = "#555555"
+    LIGHT_PURPLE = "#ff55ff"
 
+    @classmethod
+    def from_xaero(cls, index: int):
+        """Map a Xaero waypoint color index (Minecraft's 16 chat colors)."""
+        return XAERO_COLORS[index % len(XAERO_COLORS)]
+
+
+# Xaero's color indices, in Minecraft chat color order
+XAERO_COLORS = (
+    Colors.BLACK,
+    Colors.DARK_BLUE,
+    Colors.DARK_GREEN,
+    Colors.DARK_AQUA,
+    Colors.DARK_RED,
+    Colors.DARK_PURPLE,
+    Colors.GOLD,
+    Colors.GRAY,
+    Colors.DARK_GRAY,
+    Colors.BLUE,
+    Colors.GREEN,
+    Colors.AQUA,
+    Colors.RED,
+    Colors.LIGHT_PURPLE,
+    Colors.YELLOW,
+    Colors.WHITE,
+)
+
+
+class StructureType(IntEnum):
+    """Structures with region-based placement, numbered as in cubiomes."""
+
+    DESERT_PYRAMID = 1
+    JUNGLE_TEMPLE = 2
+    SWAMP_HUT = 3
+    IGLOO = 4
+    VILLAGE = 5
+    OCEAN_RUIN = 6
+    SHIPWRECK = 7
+    MONUMENT = 8
+    MANSION = 9
+    OUTPOST = 10
+    RUINED_PORTAL = 11
+    RUINED_PORTAL_NETHER = 12
+    ANCIENT_CITY = 13
+    FORTRESS = 18
+    BASTION = 19
+    END_CITY = 20
+    TRAIL_RUINS = 23
+    # Not region based; found through cubiomes' stronghold iterator instead
+    STRONGHOLD = 1000
+
+    @property
+    def dimension(self):
+        if self in (
+            StructureType.RUINED_PORTAL_NETHER,
+            StructureType.FORTRESS,
+            StructureType.BASTION,
+        ):
+            return Dimension.NETHER
+        if self == StructureType.END_CITY:
+            return Dimension.END
+        return Dimension.OVERWORLD
+
+
+MAX_STRONGHOLDS = 128
+
+
+class GeneratorPool:
+    """A bounded LRU pool of seeded cubiomes generators.
+
+    Generators are keyed by (version, flags, seed, dimension) and checked out
+    exclusively while in use, so a render never shares its generator with a
+    concurrent one. Idle generators beyond max_size are freed, least recently
+    used first.
+    """
+
+    def __init__(self, cubiomes, max_size: int = 8):
+        self.cubiomes = cubiomes
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._idle = OrderedDict()
+        self._idle_count = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, version, flags, seed, dimension):
+        key = (int(version), int(flags), int(seed) & 0xFFFFFFFFFFFFFFFF, int(dimension))
+        handle = None
+        with self._lock:
+            handles = self._idle.get(key)
+            if handles:
+                handle = handles.pop()
+                self._idle_count -= 1
+                if not handles:
+                    del self._idle[key]
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if handle is None:
+            handle = self.cubiomes.create_generator(*key)
+            if not handle:
+                raise MemoryError("Failed to allocate a cubiomes generator")
+
+        try:
+            yield handle
+        finally:
+            self._release(key, handle)
+
+    def _release(self, key, handle):
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(key, []).append(handle)
+            self._idle.move_to_end(key)
+            self._idle_count += 1
+            while self._idle_count > self.max_size:
+                oldest_key, handles = next(iter(self._idle.items()))
+                evicted.append(handles.pop(0))
+                self._idle_count -= 1
+                if not handles:
+                    del self._idle[oldest_key]
+        for old_handle in evicted:
+            self.cubiomes.free_generator(old_handle)
+
+    def clear(self):
+        """Free every idle generator."""
+        with self._lock:
+            handles = [handle for group in self._idle.values() for handle in group]
+            self._idle.clear()
+            self._idle_count = 0
+        for handle in handles:
+            self.cubiomes.free_generator(handle)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "idle": self._idle_count,
+                "max_size": self.max_size,
+            }
+
+
+# Every function CtypesBackend needs from the wrapper library
+WRAPPER_SYMBOLS = (
+    "create_generator",
+    "free_generator",
+    "generator_biome_image",
+    "generator_biome_grid",
+    "get_image_size",
+    "get_biome_colors",
+    "biome_grid_to_image",
+    "get_biome_grid_size",
+    "get_structure_region_size",
+    "generator_find_structures",
+    "generator_find_strongholds",
+)
+
+
+class CtypesBackend:
+    """Loads the wrapper shared library through ctypes.
+
+    Used when the native _cubiomes extension has not been built. Exposes the
+    same functions as the extension, taking buffer-protocol objects.
+
+    Raises:
+        OSError: The library cannot be loaded, or was built from an older
+            cubiomes_wrapper.c and lacks some of WRAPPER_SYMBOLS.
+    """
 
-class CubiomesWrapper:
     def __init__(self, dll_path: str):
         self.cubiomes = ctypes.CDLL(dll_path)
+        missing = [name for name in WRAPPER_SYMBOLS if not hasattr(self.cubiomes, name)]
+        if missing:
+            raise OSError(
+                f"{dll_path} is missing {', '.join(missing)}, rebuild it with "
+                "compile_wrapper.sh or compile_wrapper.bat"
+            )
         self._define_function_signatures()
 
     def _define_function_signatures(self):
-        self.cubiomes.generate_biome_image.argtypes = [
+        self.cubiomes.create_generator.argtypes = [c_int, c_uint32, c_uint64, c_int]
+        self.cubiomes.create_generator.restype = c_void_p
+
+        self.cubiomes.free_generator.argtypes = [c_void_p]
+        self.cubiomes.free_generator.restype = None
+
+        self.cubiomes.generator_biome_image.argtypes = [
+            c_void_p,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            POINTER(c_ubyte),
+            c_int,
+        ]
+        self.cubiomes.generator_biome_image.restype = c_int
+
+        self.cubiomes.generator_biome_grid.argtypes = [
+            c_void_p,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            c_int,
+            POINTER(c_int),
+            c_int,
+        ]
+        self.cubiomes.generator_biome_grid.restype = c_int
+
+        self.cubiomes.get_image_size.argtypes = [c_int, c_int, c_int]
+        self.cubiomes.get_image_size.restype = c_int
+
+        self.cubiomes.get_biome_colors.argtypes = [POINTER(c_ubyte)]
+        self.cubiomes.get_biome_colors.restype = None
+
+        self.cubiomes.biome_grid_to_image.argtypes = [
+            POINTER(c_int),
+            c_int,
+            c_int,
+            c_int,
+            POINTER(c_ubyte),
+            c_int,
+        ]
+        self.cubiomes.biome_grid_to_image.restype = c_int
+
+        self.cubiomes.get_biome_grid_size.argtypes = [
             c_int,
             c_uint32,
-            c_uint64,
             c_int,
             c_int,
             c_int,
             c_int,
+        ]
+        self.cubiomes.get_biome_grid_size.restype = c_int
+
+        self.cubiomes.get_structure_region_size.argtypes = [c_int, c_int]
+        self.cubiomes.get_structure_region_size.restype = c_int
+
+        self.cubiomes.generator_find_structures.argtypes = [
+            c_void_p,
+            c_int,
+            c_int,
             c_int,
             c_int,
             c_int,
+            POINTER(c_int),
             c_int,
+        ]
+        self.cubiomes.generator_find_structures.restype = c_int
+
+        self.cubiomes.generator_find_strongholds.argtypes = [
+            c_void_p,
+            POINTER(c_int),
             c_int,
         ]
-        self.cubiomes.generate_biome_image.restype = None
+        self.cubiomes.generator_find_strongholds.restype = c_int
 
-        self.cubiomes.get_image_buffer.argtypes = []
-        self.cubiomes.get_image_buffer.restype = POINTER(c_ubyte)
+    @staticmethod
+    def _bytes(buffer):
+        view = memoryview(buffer).cast("B")
+        return (c_ubyte * view.nbytes).from_buffer(view), view.nbytes
 
-        self.cubiomes.get_image_size.argtypes = []
-        self.cubiomes.get_image_size.restype = c_int
+    @staticmethod
+    def _ints(buffer):
+        ids = np.frombuffer(buffer, dtype=np.intc)
+        return ids.ctypes.data_as(POINTER(c_int)), ids.size
 
-    def generate_biome_image(
-        self, version, flags, seed, dimension, x, z, sx, sz, y, sy, pix4cell, scale
+    def create_generator(self, version, flags, seed, dimension):
+        return self.cubiomes.create_generator(version, flags, seed, dimension)
+
+    def free_generator(self, generator):
+        self.cubiomes.free_generator(generator)
+
+    def get_image_size(self, sx, sz, pix4cell):
+        return self.cubiomes.get_image_size(sx, sz, pix4cell)
+
+    def get_biome_grid_size(self, version, flags, scale, sx, sy, sz):
+        return self.cubiomes.get_biome_grid_size(version, flags, scale, sx, sy, sz)
+
+    def get_biome_colors(self, buffer):
+        self.cubiomes.get_biome_colors(self._bytes(buffer)[0])
+
+    def biome_grid_to_image(self, ids, sx, sz, pix4cell, buffer):
+        ids_pointer, ids_length = self._ints(ids)
+        if ids_length < sx * sz:
+            return -1
+        return self.cubiomes.biome_grid_to_image(
+            ids_pointer, sx, sz, pix4cell, *self._bytes(buffer)
+        )
+
+    def generator_biome_image(
+        self, generator, x, z, sx, sz, y, sy, pix4cell, scale, buffer
+    ):
+        return self.cubiomes.generator_biome_image(
+            generator, x, z, sx, sz, y, sy, pix4cell, scale, *self._bytes(buffer)
+        )
+
+    def generator_biome_grid(self, generator, x, z, sx, sz, y, sy, scale, buffer):
+        return self.cubiomes.generator_biome_grid(
+            generator, x, z, sx, sz, y, sy, scale, *self._ints(buffer)
+        )
+
+    def get_structure_region_size(self, structure, version):
+        return self.cubiomes.get_structure_region_size(structure, version)
+
+    def generator_find_structures(
+        self, generator, structure, reg_x0, reg_z0, reg_x1, reg_z1, buffer
     ):
-        self.cubiomes.generate_biome_image(
-            version, flags, seed, dimension, x, z, sx, sz, y, sy, pix4cell, scale
+        positions, length = self._ints(buffer)
+        return self.cubiomes.generator_find_structures(
+            generator, structure, reg_x0, reg_z0, reg_x1, reg_z1, positions, length // 2
         )
 
-    def get_image_buffer(self):
-        image_size = self.cubiomes.get_image_size()
-        image_buffer = self.cubiomes.get_image_buffer()
-        image_data = string_at(image_buffer, image_size)
-        return image_data
+    def generator_find_strongholds(self, generator, buffer):
+        positions, length = self._ints(buffer)
+        return self.cubiomes.generator_find_strongholds(
+            generator, positions, length // 2
+        )
+
+
+def default_library_path():
+    """Return the path of the wrapper shared library built next to this module."""
+    # Not cubiomes_wrapper.so, which Python would import in place of this module
+    if sys.platform == "win32":
+        name = "cubiomes_wrapper.dll"
+    else:
+        name = "libcubiomes_wrapper.so"
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+
+
+def load_backend(dll_path: str = None):
+    """Load the native _cubiomes extension, falling back to ctypes.
+
+    The ctypes backend is used when the extension has not been built, or
+    when an explicit shared library path is given.
+    """
+    if dll_path is None:
+        try:
+            from waypoint_mapper import _cubiomes
+
+            return _cubiomes
+        except ImportError:
+            dll_path = default_library_path()
+    return CtypesBackend(dll_path)
+
+
+class CubiomesWrapper:
+    def __init__(self, dll_path: str = None, pool_size: int = 8):
+        self.cubiomes = load_backend(dll_path)
+        self.generator_pool = GeneratorPool(self.cubiomes, pool_size)
+
+    def get_image_size(self, sx, sz, pix4cell):
+        """Return the number of bytes needed to hold a PPM image of sx by sz cells."""
+        return self.cubiomes.get_image_size(sx, sz, pix4cell)
+
+    def generate_biome_image(
+        self,
+        version,
+        flags,
+        seed,
+        dimension,
+        x,
+        z,
+        sx,
+        sz,
+        y,
+        sy,
+        pix4cell,
+        scale,
+        buffer=None,
+    ):
+        """Render a PPM biome image into a caller-owned buffer.
+
+        The buffer may be any writable object supporting the buffer protocol
+        (e.g. a bytearray) of at least get_image_size() bytes. A new bytearray
+        is allocated when no buffer is given. Seeded generators are reused
+        from the generator pool.
+
+        Returns:
+            memoryview: The PPM image data, a view into the buffer.
+        """
+        if buffer is None:
+            buffer = bytearray(self.get_image_size(sx, sz, pix4cell))
+        view = memoryview(buffer).cast("B")
+        with self.generator_pool.acquire(version, flags, seed, dimension) as generator:
+            written = self.cubiomes.generator_biome_image(
+                generator, x, z, sx, sz, y, sy, pix4cell, scale, view
+            )
+        if written == -1:
+            raise ValueError(
+                f"Image buffer too small: {view.nbytes} bytes, "
+                f"need {self.get_image_size(sx, sz, pix4cell)}"
+            )
+        if written < 0:
+            raise RuntimeError(f"Biome generation failed with code {written}")
+        return view[:written]
+
+    def get_biome_colors(self):
+        """Return the default cubiomes biome colors as a (256, 3) uint8 array."""
+        colors = np.zeros((256, 3), dtype=np.uint8)
+        self.cubiomes.get_biome_colors(colors)
+        return colors
+
+    def biome_grid_to_image(self, grid, pix4cell, buffer=None):
+        """Color a 2D grid of biome IDs into a PPM image.
+
+        Returns:
+            memoryview: The PPM image data, a view into the buffer.
+        """
+        ids = np.ascontiguousarray(grid, dtype=np.intc)
+        sz, sx = ids.shape
+        if buffer is None:
+            buffer = bytearray(self.get_image_size(sx, sz, pix4cell))
+        view = memoryview(buffer).cast("B")
+        written = self.cubiomes.biome_grid_to_image(ids, sx, sz, pix4cell, view)
+        if written < 0:
+            raise ValueError(
+                f"Image buffer too small: {view.nbytes} bytes, "
+                f"need {self.get_image_size(sx, sz, pix4cell)}"
+            )
+        return view[:written]
+
+    def get_biome_grid_size(self, version, flags, scale, sx, sy, sz):
+        """Return the number of ints genBiomes needs to generate sx by sy by sz cells."""
+        return self.cubiomes.get_biome_grid_size(version, flags, scale, sx, sy, sz)
+
+    def generate_biome_grid(
+        self,
+        version,
+        flags,
+        seed,
+        dimension,
+        x,
+        z,
+        sx,
+        sz,
+        y,
+        sy,
+        scale,
+        buffer=None,
+        generator=None,
+    ):
+        """Generate the raw biome IDs of an area without building an image.
+
+        The buffer may be any writable object supporting the buffer protocol
+        (e.g. a bytearray or NumPy array) of at least get_biome_grid_size()
+        C ints. A new array is allocated when no buffer is given. Seeded
+        generators are reused from the generator pool, unless a generator
+        acquired from it for the same parameters is passed in.
+
+        Returns:
+            numpy.ndarray: A view into the buffer of shape (sz, sx), or
+            (sy, sz, sx) when more than one vertical layer is requested.
+        """
+        if buffer is None:
+            buffer = np.empty(
+                self.get_biome_grid_size(version, flags, scale, sx, sy, sz),
+                dtype=np.intc,
+            )
+        ids = np.frombuffer(buffer, dtype=np.intc)
+        if not ids.flags.writeable:
+            raise TypeError("Biome grid buffer must be writable")
+        if generator is None:
+            acquired = self.generator_pool.acquire(version, flags, seed, dimension)
+        else:
+            acquired = nullcontext(generator)
+        with acquired as generator:
+            count = self.cubiomes.generator_biome_grid(
+                generator, x, z, sx, sz, y, sy, scale, ids
+            )
+        if count == -1:
+            raise ValueError(
+                f"Biome grid buffer too small: {ids.size} ints, "
+                f"need {self.get_biome_grid_size(version, flags, scale, sx, sy, sz)}"
+            )
+        if count < 0:
+            raise RuntimeError(f"Biome generation failed with code {count}")
+        grid = ids[:count].reshape(max(sy, 1), sz, sx)
+        return grid[0] if sy <= 1 else grid
+
+    def get_structure_region_size(self, structure, version):
+        """Return a structure's placement region size in chunks, or -1 if it does not generate."""
+        return self.cubiomes.get_structure_region_size(int(structure), int(version))
+
+    def find_structures(
+        self, version, flags, seed, structure, reg_x0, reg_z0, reg_x1, reg_z1
+    ):
+        """Find the viable positions of a structure in a block of regions.
+
+        Every region in [reg_x0, reg_x1] by [reg_z0, reg_z1] is checked with
+        cubiomes' placement and biome viability rules.
+
+        Returns:
+            numpy.ndarray: Block (x, z) positions of shape (n, 2).
+        """
+        structure = StructureType(structure)
+        regions = (reg_x1 - reg_x0 + 1) * (reg_z1 - reg_z0 + 1)
+        positions = np.empty((regions, 2), dtype=np.intc)
+        with self.generator_pool.acquire(
+            version, flags, seed, structure.dimension
+        ) as generator:
+            count = self.cubiomes.generator_find_structures(
+                generator, structure, reg_x0, reg_z0, reg_x1, reg_z1, positions
+            )
+        if count < 0:
+            raise RuntimeError(f"Structure search failed with code {count}")
+        return positions[:count]
+
+    def find_strongholds(self, version, flags, seed):
+        """Find every stronghold of a seed.
+
+        Returns:
+            numpy.ndarray: Block (x, z) positions of shape (n, 2).
+        """
+        positions = np.empty((MAX_STRONGHOLDS, 2), dtype=np.intc)
+        with self.generator_pool.acquire(
+            version, flags, seed, Dimension.OVERWORLD
+        ) as generator:
+            count = self.cubiomes.generator_find_strongholds(generator, positions)
+        return positions[:count]
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from waypoint_mapper.metrics import MetricsSink
+
+# Pillow save options per format, from fastest to smallest output
+ENCODE_SPEEDS = {
+    "PNG": {
+        "fast": {"compress_level": 1},
+        "balanced": {"compress_level": 6},
+        "small": {"compress_level": 9, "optimize": True},
+    },
+    "WEBP": {
+        "fast": {"lossless": True, "method": 0, "quality": 0},
+        "balanced": {"lossless": True, "method": 4, "quality": 80},
+        "small": {"lossless": True, "method": 6, "quality": 100},
+    },
+}
+
+
+def encode_image(image, image_format: str = "PNG", speed: str = "balanced"):
+    """Encode an image in memory.
+
+    Args:
+        image (PIL.Image.Image): The image to encode.
+        image_format (str): PNG or WEBP.
+        speed (str): fast, balanced or small, trading encode time for size.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    image_format = image_format.upper()
+    try:
+        options = ENCODE_SPEEDS[image_format][speed]
+    except KeyError:
+        raise ValueError(f"Unsupported encoding: {image_format} ({speed})")
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def _canonical(value):
+    if isinstance(value, Enum):
+        return _canonical(value.value)
+    if isinstance(value, float):
+        return repr(value)
+    return value
+
+
+def render_key(**params):
+    """Hash render parameters into a key that is stable across processes."""
+    canonical = {name: _canonical(value) for name, value in params.items()}
+    encoded = json.dumps(canonical, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class EncodedMapCache:
+    """A size-bounded LRU cache of encoded images keyed by render_key()."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old)
+            self._entries[key] = data
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class MapEncoder:
+    """Encodes rendered maps on a worker thread and caches the bytes.
+
+    Repeat requests with the same render parameters are answered from the
+    cache without rendering or encoding. Encode times are reported to
+    metrics as render.encode.
+    """
+
+    def __init__(
+        self,
+        cache: EncodedMapCache = None,
+        image_format: str = "PNG",
+        speed: str = "balanced",
+        max_workers: int = 1,
+        metrics: MetricsSink = None,
+    ):
+        self.metrics = metrics
+        self.cache = EncodedMapCache() if cache is None else cache
+        self.image_format = image_format.upper()
+        self.speed = speed
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="map-encoder"
+        )
+
+    @property
+    def extension(self):
+        return self.image_format.lower()
+
+    async def encode(self, image):
+        """Encode an image without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        data = await loop.run_in_executor(
+            self._executor, encode_image, image, self.image_format, self.speed
+        )
+        if self.metrics is not None:
+            self.metrics.observe("render.encode", time.perf_counter() - started)
+        return data
+
+    async def render(self, render, **params):
+        """Return the encoded map for params, rendering it only on a cache miss.
+
+        Args:
+            render (callable): A coroutine function rendering the map from
+                params and returning a PIL image.
+
+        Returns:
+            io.BytesIO: The encoded image, ready for discord.File.
+        """
+        key = render_key(image_format=self.image_format, speed=self.speed, **params)
+        data = self.cache.get(key)
+        if data is None:
+            image = await render(**params)
+            data = await self.encode(image)
+            self.cache.put(key, data)
+        return io.BytesIO(data)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -1,5 +1,7 @@
-import io
-from PIL import Image, ImageDraw, ImageFont
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack
+import numpy as np
 from waypoint_mapper import (
     CubiomesWrapper,
     MinecraftVersion,
@@ -7,11 +9,34 @@ from waypoint_mapper import (
     Flags,
     Colors,
 )
+from waypoint_mapper.colorize import biome_grid_image
+from waypoint_mapper.markers import color_value, draw_marker, place_labels
+from waypoint_mapper.metrics import MetricsSink, RenderTimings, report_timings
+from waypoint_mapper.pyramid import nearest_native_scale
+from waypoint_mapper.tile_cache import TileCache, sample_y
 
 
 class MapGenerator:
-    def __init__(self, dll_path: str = "./waypoint_mapper/cubiomes_wrapper.dll"):
+    def __init__(
+        self,
+        dll_path: str = None,
+        tile_cache: TileCache = None,
+        palette=None,
+        metrics: MetricsSink = None,
+        slow_render_seconds: float = 2.0,
+        max_viewports: int = 64,
+    ):
         self.cubiomes = CubiomesWrapper(dll_path)
+        self.tile_cache = tile_cache
+        self.metrics = metrics
+        # Renders slower than this are logged with their stage timings
+        self.slow_render_seconds = slow_render_seconds
+        # A (256, 3) uint8 lookup table of biome colors, cubiomes' by default
+        self.palette = self.cubiomes.get_biome_colors() if palette is None else palette
+        # The last biome grid of each viewport, least recently used first
+        self.max_viewports = max_viewports
+        self._viewports = OrderedDict()
+        self._viewports_lock = threading.Lock()
 
     def generate_map_image(
         self,
@@ -25,137 +50,319 @@ class MapGenerator:
         flags,
         zoom=1.0,
         aspect_ratio=4 / 3,
+        viewport=None,
+    ):
+        """Render a map centered on one waypoint.
+
+        Args:
+            viewport (hashable): Identifies a user's or channel's view, see
+                _viewport_grid. Panning a viewport only generates the newly
+                exposed part of the map.
+        """
+        timings = RenderTimings()
+        image, _ = self._render_area(
+            x, z, dimension, seed, version, flags, zoom, aspect_ratio, timings, viewport
+        )
+
+        # Annotate the image with a triangle and text
+        with timings.stage("annotate"):
+            self._annotate_image(image, name, color)
+
+        self._record_timings(image, timings, f"map at ({x}, {z}) zoom {zoom}")
+        return image
+
+    def generate_waypoints_map(
+        self,
+        markers,
+        dimension,
+        seed,
+        version,
+        flags,
+        x=None,
+        z=None,
+        zoom=1.0,
+        aspect_ratio=4 / 3,
+        viewport=None,
     ):
+        """Render several waypoints on one map from a single biome generation.
+
+        Args:
+            markers (list): MapMarker entries, see markers_from_waypoints.
+            x (int): The block x of the viewport center, defaults to the center
+                of the markers.
+            z (int): The block z of the viewport center, defaults to the center
+                of the markers.
+            viewport (hashable): Reuses the viewport's last biome grid, see
+                generate_map_image.
+
+        Returns:
+            PIL.Image.Image: The map with every visible marker drawn.
+
+        Raises:
+            ValueError: There are no markers to center on and x or z is None.
+        """
+        if x is None or z is None:
+            if not markers:
+                raise ValueError("A map without markers needs an x and z center")
+            x = (min(m.x for m in markers) + max(m.x for m in markers)) // 2
+            z = (min(m.z for m in markers) + max(m.z for m in markers)) // 2
+
+        timings = RenderTimings()
+        image, to_pixel = self._render_area(
+            x, z, dimension, seed, version, flags, zoom, aspect_ratio, timings, viewport
+        )
+
+        with timings.stage("annotate"):
+            # Cull markers whose point falls outside the image
+            visible = []
+            for marker in markers:
+                px, py = to_pixel(marker.x, marker.z)
+                if 0 <= px < image.width and 0 <= py < image.height:
+                    visible.append((px, py, marker.name, color_value(marker.color)))
+
+            placements = place_labels(visible, image.width, image.height)
+            for (px, py, name, color), placement in zip(visible, placements):
+                draw_marker(image, px, py, name, color, placement=placement)
+
+        self._record_timings(
+            image, timings, f"{len(markers)} waypoint map at ({x}, {z}) zoom {zoom}"
+        )
+        return image
+
+    def warm_map(
+        self, x, z, dimension, seed, version, flags, zoom=1.0, aspect_ratio=4 / 3
+    ):
+        """Fill the tile cache with the biomes a map at (x, z) would show."""
+        if self.tile_cache is None:
+            raise ValueError("Warming maps requires a tile cache")
+        self._render_area(
+            x, z, dimension, seed, version, flags, zoom, aspect_ratio, RenderTimings()
+        )
+
+    def _record_timings(self, image, timings, description):
+        """Attach the stage timings to the image and report them."""
+        image.info["render_timings"] = timings.as_dict()
+        report_timings(
+            image.info["render_timings"],
+            self.metrics,
+            self.slow_render_seconds,
+            description,
+        )
+
+    def forget_viewport(self, viewport):
+        """Drop the biome grid kept for a viewport."""
+        with self._viewports_lock:
+            self._viewports.pop(viewport, None)
+
+    def _render_area(
+        self,
+        x,
+        z,
+        dimension,
+        seed,
+        version,
+        flags,
+        zoom,
+        aspect_ratio,
+        timings,
+        viewport=None,
+    ):
+        """Render the biomes around block (x, z), timing each stage.
+
+        Returns:
+            tuple: The image and a function mapping block (x, z) to pixels.
+        """
         # Calculate the height and width in pixels, ensuring the height is at least 600 pixels
         # height = max(600, int(600 * zoom))
         height = 600
         width = int(height * aspect_ratio)
 
-        # Calculate pix4cell based on the zoom level, ensuring it's at least 1
         if zoom >= 1:
+            # Block-level sampling, upscaled by pix4cell
             pix4cell = int(zoom)
-            scale = 1
-        else:
-            pix4cell = 1
-            scale = int(1 / zoom)
+            sx = width // pix4cell
+            sz = height // pix4cell
 
-        # Calculate the size of the image adjusted for the scale and pix4cell
-        sx = (width * scale) // pix4cell
-        sz = (height * scale) // pix4cell
+            # Calculate the top left block of the image
+            cx = x - (sx // 2)
+            cz = z - (sz // 2)
 
-        # Calculate the center coordinates of the image
-        cx = x - (sx // 2)
-        cz = z - (sz // 2)
+            grid = self._viewport_grid(
+                viewport, cx, cz, sx, sz, 1, dimension, seed, version, flags, timings
+            )
 
-        y = 15  # Near sea level
-        sy = 1  # Single vertical layer
+            # Color and upscale the biome IDs straight into an image
+            with timings.stage("colorize"):
+                image = biome_grid_image(grid, self.palette, pix4cell)
 
-        # Generate the biome image
-        self.cubiomes.generate_biome_image(
-            version.value,
-            flags.value,
-            seed,
-            dimension.value,
+            def to_pixel(block_x, block_z):
+                return (
+                    (block_x - cx) * pix4cell + pix4cell // 2,
+                    (block_z - cz) * pix4cell + pix4cell // 2,
+                )
+
+            return image, to_pixel
+
+        # Sample the nearest native scale and resample it to the image size
+        blocks_per_pixel = 1 / zoom
+        scale = nearest_native_scale(blocks_per_pixel)
+
+        # The cell under every pixel column and row, centered on (x, z)
+        cell_xs = np.floor(
+            (x + (np.arange(width) - width // 2) * blocks_per_pixel) / scale
+        ).astype(np.int64)
+        cell_zs = np.floor(
+            (z + (np.arange(height) - height // 2) * blocks_per_pixel) / scale
+        ).astype(np.int64)
+        cx, cz = int(cell_xs[0]), int(cell_zs[0])
+
+        grid = self._viewport_grid(
+            viewport,
             cx,
             cz,
-            sx,
-            sz,
-            y,
-            sy,
-            pix4cell,
+            int(cell_xs[-1]) - cx + 1,
+            int(cell_zs[-1]) - cz + 1,
             scale,
+            dimension,
+            seed,
+            version,
+            flags,
+            timings,
         )
+        with timings.stage("resample"):
+            grid = grid[np.ix_(cell_zs - cz, cell_xs - cx)]
+        with timings.stage("colorize"):
+            image = biome_grid_image(grid, self.palette)
 
-        # Retrieve the image data from the DLL
-        image_data = self.cubiomes.get_image_buffer()
-        image = Image.open(io.BytesIO(image_data))
+        def to_pixel(block_x, block_z):
+            return (
+                int((block_x - x) / blocks_per_pixel) + width // 2,
+                int((block_z - z) / blocks_per_pixel) + height // 2,
+            )
 
-        # Annotate the image with a triangle and text
-        self._annotate_image(image, name, color)
+        return image, to_pixel
 
-        return image
+    def _viewport_grid(
+        self, viewport, cx, cz, sx, sz, scale, dimension, seed, version, flags, timings
+    ):
+        """Return the biome grid of a viewport, reusing its last grid.
 
-    def _annotate_image(self, image, name, color):
-        draw = ImageDraw.Draw(image)
-        center_x = image.width // 2
-        center_y = image.height // 2
-        triangle_color = color.value
-        triangle_size = 20
-        outline_thickness = 2
-        outline_color = "black"
-
-        # Define the coordinates for the triangle with the point at the bottom
-        triangle = [
-            (center_x, center_y),
-            (center_x - triangle_size, center_y - triangle_size),
-            (center_x + triangle_size, center_y - triangle_size),
-        ]
-
-        # Draw black outline
-        for i in range(-outline_thickness, outline_thickness + 1):
-            for j in range(-outline_thickness, outline_thickness + 1):
-                offset_triangle = [(x + i, y + j) for x, y in triangle]
-                draw.polygon(offset_triangle, fill=outline_color)
-
-        draw.polygon(triangle, fill=triangle_color)
-
-        # Add text above the triangle
-        wrapped_text = wrap_text(name, 21)
-        text_color = triangle_color
-        font_size = 24
-        try:
-            # font = ImageFont.truetype("./Minecraftia-Regular.ttf", font_size) TODO: Find a font file that works with multiple font sizes.
-            font = ImageFont.truetype("arial.ttf", font_size)
-        except IOError:
-            font = ImageFont.load_default()
-
-        total_text_height = 0
-        text_positions = []
-        for line in wrapped_text:
-            text_bbox = draw.textbbox((0, 0), line, font=font)
-            text_height = text_bbox[3] - text_bbox[1]
-            total_text_height += text_height
-            text_positions.append((line, text_height))
-
-        text_y = center_y - triangle_size - total_text_height - 10
-
-        current_y = text_y
-        for line, text_height in text_positions:
-            text_bbox = draw.textbbox((0, 0), line, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_x = center_x - text_width // 2
-            for i in range(-outline_thickness, outline_thickness + 1):
-                for j in range(-outline_thickness, outline_thickness + 1):
-                    draw.text(
-                        (text_x + i, current_y + j), line, font=font, fill=outline_color
-                    )
-            draw.text((text_x, current_y), line, fill=text_color, font=font)
-            current_y += text_height
+        The part of the new window that overlaps the viewport's previous
+        window at the same scale is copied over, and only the newly exposed
+        strips around it are generated.
+        """
+        if viewport is None:
+            return self._biome_grid(
+                cx, cz, sx, sz, scale, dimension, seed, version, flags, timings
+            )
 
+        world = (dimension, seed, version, flags, scale)
+        with self._viewports_lock:
+            last = self._viewports.get(viewport)
 
-# Text wrapping function
-def wrap_text(text, line_length):
-    words = text.split(" ")
-    lines = []
-    current_line = ""
+        # The overlap of the new window with the last one, in cells
+        x0 = z0 = x1 = z1 = 0
+        if last is not None and last[0] == world:
+            _, last_cx, last_cz, last_grid = last
+            last_sz, last_sx = last_grid.shape
+            x0, x1 = max(cx, last_cx), min(cx + sx, last_cx + last_sx)
+            z0, z1 = max(cz, last_cz), min(cz + sz, last_cz + last_sz)
 
-    for word in words:
-        if len(current_line) + len(word) + 1 <= line_length:
-            if current_line:
-                current_line += " "
-            current_line += word
+        if x0 >= x1 or z0 >= z1:
+            grid = self._biome_grid(
+                cx, cz, sx, sz, scale, dimension, seed, version, flags, timings
+            )
         else:
-            if current_line:
-                lines.append(current_line)
-            if len(word) > line_length:
-                while len(word) > line_length:
-                    lines.append(word[: line_length - 1] + "-")
-                    word = word[line_length - 1 :]
-                current_line = word
-            else:
-                current_line = word
-
-    if current_line:
-        lines.append(current_line)
-
-    return lines
+            grid = np.empty((sz, sx), dtype=last_grid.dtype)
+            with timings.stage("pan"):
+                grid[z0 - cz : z1 - cz, x0 - cx : x1 - cx] = last_grid[
+                    z0 - last_cz : z1 - last_cz, x0 - last_cx : x1 - last_cx
+                ]
+
+            # Full-width strips above and below the overlap, then the sides
+            strips = (
+                (cx, cz, sx, z0 - cz),
+                (cx, z1, sx, cz + sz - z1),
+                (cx, z0, x0 - cx, z1 - z0),
+                (x1, z0, cx + sx - x1, z1 - z0),
+            )
+            for strip_x, strip_z, strip_sx, strip_sz in strips:
+                if strip_sx <= 0 or strip_sz <= 0:
+                    continue
+                grid[
+                    strip_z - cz : strip_z - cz + strip_sz,
+                    strip_x - cx : strip_x - cx + strip_sx,
+                ] = self._biome_grid(
+                    strip_x,
+                    strip_z,
+                    strip_sx,
+                    strip_sz,
+                    scale,
+                    dimension,
+                    seed,
+                    version,
+                    flags,
+                    timings,
+                )
+
+        with self._viewports_lock:
+            self._viewports[viewport] = (world, cx, cz, grid)
+            self._viewports.move_to_end(viewport)
+            while len(self._viewports) > self.max_viewports:
+                self._viewports.popitem(last=False)
+        return grid
+
+    def _biome_grid(
+        self, cx, cz, sx, sz, scale, dimension, seed, version, flags, timings
+    ):
+        """Return the biome IDs of sx by sz cells starting at cell (cx, cz).
+
+        Generator setup and seeding are timed as their own stage only when
+        there is no tile cache, since cached areas may need no generator.
+        """
+        y = sample_y(scale)
+        sy = 1  # Single vertical layer
+
+        if self.tile_cache is not None:
+            # Compose the area from cached tiles, generating only missing ones
+            with timings.stage("biomes"):
+                return self.tile_cache.get_area(
+                    self.cubiomes,
+                    version.value,
+                    flags.value,
+                    seed,
+                    dimension.value,
+                    cx,
+                    cz,
+                    sx,
+                    sz,
+                    scale,
+                )
+
+        with ExitStack() as stack:
+            # Creating and seeding a generator on a pool miss
+            with timings.stage("generator"):
+                generator = stack.enter_context(
+                    self.cubiomes.generator_pool.acquire(
+                        version.value, flags.value, seed, dimension.value
+                    )
+                )
+            with timings.stage("biomes"):
+                return self.cubiomes.generate_biome_grid(
+                    version.value,
+                    flags.value,
+                    seed,
+                    dimension.value,
+                    cx,
+                    cz,
+                    sx,
+                    sz,
+                    y,
+                    sy,
+                    scale,
+                    generator=generator,
+                )
+
+    def _annotate_image(self, image, name, color):
+        # The marker's point sits at the center of the image
+        draw_marker(image, image.width // 2, image.height // 2, name, color.value)
@@ -0,0 +1,236 @@
+from enum import Enum
+from functools import lru_cache
+from typing import NamedTuple, Union
+from PIL import Image, ImageDraw, ImageFont
+from waypoint_mapper.cubiomes_wrapper import Colors
+
+TRIANGLE_SIZE = 20
+OUTLINE_THICKNESS = 2
+OUTLINE_COLOR = "black"
+FONT_SIZE = 24
+LABEL_GAP = 10  # Space between the label and the top of the triangle
+LINE_LENGTH = 21
+PLACEMENTS = ("above", "below", "right", "left")
+
+
+class MapMarker(NamedTuple):
+    name: str
+    color: Union[Colors, str]
+    x: int
+    z: int
+
+
+def markers_from_waypoints(waypoints):
+    """Convert stored waypoint rows to map markers.
+
+    Args:
+        waypoints (list): Waypoint models.
+
+    Returns:
+        list: A MapMarker per waypoint.
+    """
+    markers = []
+    for waypoint in waypoints:
+        markers.append(
+            MapMarker(
+                name=waypoint.name,
+                color=Colors.from_xaero(waypoint.color),
+                x=waypoint.x,
+                z=waypoint.z,
+            )
+        )
+    return markers
+
+
+def color_value(color):
+    return color.value if isinstance(color, Enum) else color
+
+
+@lru_cache(maxsize=None)
+def load_font(font_size):
+    """Load the label font once per size for the whole process."""
+    try:
+        # font = ImageFont.truetype("./Minecraftia-Regular.ttf", font_size) TODO: Find a font file that works with multiple font sizes.
+        return ImageFont.truetype("arial.ttf", font_size)
+    except IOError:
+        try:
+            return ImageFont.load_default(font_size)
+        except TypeError:  # Pillow < 10.1 only has a fixed size bitmap font
+            return ImageFont.load_default()
+
+
+@lru_cache(maxsize=512)
+def label_sprite(text, color, font_size=FONT_SIZE):
+    """Pre-render an outlined, wrapped, centered label as an RGBA sprite."""
+    font = load_font(font_size)
+    lines = wrap_text(text, LINE_LENGTH)
+
+    # Measure every line including its outline
+    measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    line_boxes = [
+        measure.textbbox((0, 0), line, font=font, stroke_width=OUTLINE_THICKNESS)
+        for line in lines
+    ]
+    width = max((box[2] - box[0] for box in line_boxes), default=0)
+    height = sum(box[3] - box[1] for box in line_boxes)
+
+    sprite = Image.new("RGBA", (max(width, 1), max(height, 1)), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+    current_y = 0
+    for line, box in zip(lines, line_boxes):
+        line_width = box[2] - box[0]
+        draw.text(
+            ((width - line_width) // 2 - box[0], current_y - box[1]),
+            line,
+            fill=color,
+            font=font,
+            stroke_width=OUTLINE_THICKNESS,
+            stroke_fill=OUTLINE_COLOR,
+        )
+        current_y += box[3] - box[1]
+    return sprite
+
+
+def triangle_box():
+    """Return the triangle's bounding box relative to its point."""
+    extent = TRIANGLE_SIZE + OUTLINE_THICKNESS
+    return (-extent, -extent, extent + 1, OUTLINE_THICKNESS + 1)
+
+
+def label_box(text, color, font_size=FONT_SIZE, placement="above"):
+    """Return a label's bounding box relative to the point of its marker."""
+    width, height = label_sprite(text, color, font_size).size
+    if placement == "below":
+        left, top = -(width // 2), OUTLINE_THICKNESS + LABEL_GAP
+    elif placement == "right":
+        left, top = TRIANGLE_SIZE + LABEL_GAP, -TRIANGLE_SIZE // 2 - height // 2
+    elif placement == "left":
+        left = -TRIANGLE_SIZE - LABEL_GAP - width
+        top = -TRIANGLE_SIZE // 2 - height // 2
+    else:
+        left, top = -(width // 2), -TRIANGLE_SIZE - LABEL_GAP - height
+    return (left, top, left + width, top + height)
+
+
+@lru_cache(maxsize=512)
+def marker_sprite(text, color, font_size=FONT_SIZE, placement="above"):
+    """Pre-render a marker triangle and its label as a single RGBA sprite.
+
+    Args:
+        text (str): The label drawn next to the triangle.
+        color (str): The fill color of the triangle and the label.
+        font_size (int): The label font size.
+        placement (str): Where the label sits relative to the triangle, one
+            of PLACEMENTS.
+
+    Returns:
+        tuple: The sprite image and the (x, y) offset of the triangle's point
+        within it.
+    """
+    label = label_sprite(text, color, font_size)
+    boxes = (triangle_box(), label_box(text, color, font_size, placement))
+    left = min(box[0] for box in boxes)
+    top = min(box[1] for box in boxes)
+    right = max(box[2] for box in boxes)
+    bottom = max(box[3] for box in boxes)
+    point_x, point_y = -left, -top
+
+    sprite = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+
+    # Triangle with the point at the bottom
+    triangle = [
+        (point_x, point_y),
+        (point_x - TRIANGLE_SIZE, point_y - TRIANGLE_SIZE),
+        (point_x + TRIANGLE_SIZE, point_y - TRIANGLE_SIZE),
+    ]
+    draw.polygon(triangle, fill=color, outline=OUTLINE_COLOR, width=OUTLINE_THICKNESS)
+
+    label_left, label_top, _, _ = boxes[1]
+    sprite.alpha_composite(label, (point_x + label_left, point_y + label_top))
+    return sprite, (point_x, point_y)
+
+
+def draw_marker(image, x, y, text, color, font_size=FONT_SIZE, placement="above"):
+    """Composite a cached marker sprite onto the image with its point at (x, y)."""
+    sprite, (point_x, point_y) = marker_sprite(text, color, font_size, placement)
+    image.paste(sprite, (x - point_x, y - point_y), sprite)
+
+
+def _overlap(a, b):
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    return width * height if width > 0 and height > 0 else 0
+
+
+def place_labels(markers, width, height, font_size=FONT_SIZE):
+    """Choose a label placement for every marker so labels overlap as little as possible.
+
+    Labels are placed greedily in order. Each one takes the first placement
+    that overlaps no marker, no earlier label and stays inside the image,
+    otherwise the placement with the least overlap.
+
+    Args:
+        markers (list): (x, y, text, color) tuples in image pixels.
+        width (int): The image width.
+        height (int): The image height.
+        font_size (int): The label font size.
+
+    Returns:
+        list: One entry of PLACEMENTS per marker.
+    """
+    image_area = (0, 0, width, height)
+    occupied = [
+        tuple(offset + point for offset, point in zip(triangle_box(), (x, y, x, y)))
+        for x, y, _, _ in markers
+    ]
+
+    placements = []
+    for index, (x, y, text, color) in enumerate(markers):
+        best = None
+        for placement in PLACEMENTS:
+            relative = label_box(text, color, font_size, placement)
+            box = (x + relative[0], y + relative[1], x + relative[2], y + relative[3])
+            area = (box[2] - box[0]) * (box[3] - box[1])
+            # Overlap with other markers and labels, plus any part off the image
+            cost = area - _overlap(box, image_area)
+            cost += sum(
+                _overlap(box, other)
+                for other_index, other in enumerate(occupied)
+                if other_index != index
+            )
+            if best is None or cost < best[0]:
+                best = (cost, placement, box)
+            if cost == 0:
+                break
+        placements.append(best[1])
+        occupied.append(best[2])
+    return placements
+
+
+# Text wrapping function
+def wrap_text(text, line_length):
+    words = text.split(" ")
+    lines = []
+    current_line = ""
+
+    for word in words:
+        if len(current_line) + len(word) + 1 <= line_length:
+            if current_line:
+                current_line += " "
+            current_line += word
+        else:
+            if current_line:
+                lines.append(current_line)
+            if len(word) > line_length:
+                while len(word) > line_length:
+                    lines.append(word[: line_length - 1] + "-")
+                    word = word[line_length - 1 :]
+                current_line = word
+            else:
+                current_line = word
+
+    if current_line:
+        lines.append(current_line)
+
+    return lines
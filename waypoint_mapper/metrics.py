@@ -0,0 +1,112 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RenderTimings:
+    """Accumulates the wall time of each stage of one render."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    @property
+    def total(self):
+        return sum(self.stages.values())
+
+    def as_dict(self):
+        """Return the stage timings in seconds, in order, plus their total."""
+        return dict(self.stages, total=self.total)
+
+
+class MetricsSink:
+    """Receives render timings. Subclass and override observe().
+
+    The base class discards every observation.
+    """
+
+    def observe(self, name, value):
+        pass
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket plus one for values past the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "buckets": dict(zip(bounds, self.counts)),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+class HistogramSink(MetricsSink):
+    """Keeps an in-memory histogram per metric name."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: histogram.snapshot()
+                for name, histogram in self._histograms.items()
+            }
+
+
+def report_timings(
+    timings, metrics=None, slow_render_seconds=None, description="render"
+):
+    """Send render timings to a metrics sink and log them if the render was slow.
+
+    Args:
+        timings (dict): Stage timings in seconds, see RenderTimings.as_dict.
+        metrics (MetricsSink): Receives one render.<stage> observation per stage.
+        slow_render_seconds (float): Log renders whose total exceeds this.
+        description (str): Identifies the render in the slow render log.
+    """
+    if metrics is not None:
+        for stage, seconds in timings.items():
+            metrics.observe(f"render.{stage}", seconds)
+
+    total = timings.get("total", 0.0)
+    if slow_render_seconds is not None and total > slow_render_seconds:
+        stages = ", ".join(
+            f"{stage} {seconds * 1000:.1f}ms"
+            for stage, seconds in timings.items()
+            if stage != "total"
+        )
+        logging.warning(f"Slow {description} took {total:.3f}s: {stages}")
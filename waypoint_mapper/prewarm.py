@@ -0,0 +1,220 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from waypoint_mapper.map_generator import MapGenerator
+from waypoint_mapper.pyramid import NATIVE_SCALES, ZoomPyramid
+from waypoint_mapper.tile_cache import TileCache
+
+# Queue priorities, lowest first
+PRIORITY_NEW = 0
+PRIORITY_HOT = 1
+
+# The zooms the bot renders most often
+DEFAULT_ZOOMS = (1.0, 0.25, 0.0625)
+
+# The MapGenerator and ZoomPyramid of the current worker process, created
+# once by _init_worker
+_worker_generator = None
+_worker_pyramid = None
+
+
+def _init_worker(dll_path, tile_cache_dir, tile_cache_bytes, niceness):
+    global _worker_generator, _worker_pyramid
+    # Let the scheduler lose every CPU contest against interactive renders
+    if niceness and hasattr(os, "nice"):
+        os.nice(niceness)
+    _worker_generator = MapGenerator(
+        dll_path, tile_cache=TileCache(tile_cache_dir, tile_cache_bytes)
+    )
+    _worker_pyramid = ZoomPyramid(
+        _worker_generator.cubiomes, _worker_generator.tile_cache
+    )
+
+
+def _warm_map(kwargs):
+    _worker_generator.warm_map(**kwargs)
+
+
+def _build_level(kwargs):
+    _worker_pyramid.build_level(**kwargs)
+
+
+class PrewarmScheduler:
+    """Pre-renders the tile cache around waypoints in the background.
+
+    New waypoints are queued ahead of everything else, at each of zooms.
+    Whenever the queue has been empty for idle_after seconds, the most
+    viewed waypoints that have not been warmed within rewarm_after seconds
+    get every level of a ZoomPyramid at scales queued instead, so maps at
+    any zoom around them come from the tile cache.
+
+    Jobs run one zoom or level at a time in a single low-priority worker process, and
+    only while no interactive render is in flight. After each job the
+    scheduler sleeps long enough to keep its share of one core at
+    cpu_budget.
+
+    View counts and warm times are kept for at most max_places places. The
+    least viewed and least recently warmed are forgotten first.
+    """
+
+    def __init__(
+        self,
+        dll_path: str = None,
+        tile_cache_dir: str = "./tile_cache",
+        tile_cache_bytes: int = 512 * 1024 * 1024,
+        zooms=DEFAULT_ZOOMS,
+        scales=NATIVE_SCALES,
+        cpu_budget: float = 0.25,
+        idle_after: float = 60.0,
+        rewarm_after: float = 3600.0,
+        hot_count: int = 16,
+        niceness: int = 10,
+        max_places: int = 4096,
+        mp_context=None,
+    ):
+        if not 0 < cpu_budget <= 1:
+            raise ValueError("CPU budget must be in (0, 1]")
+        self.zooms = zooms
+        self.scales = scales
+        self.cpu_budget = cpu_budget
+        self.idle_after = idle_after
+        self.rewarm_after = rewarm_after
+        self.hot_count = hot_count
+        self.max_places = max_places
+        self.views = Counter()
+        self._executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(dll_path, tile_cache_dir, tile_cache_bytes, niceness),
+        )
+        self._queue = None
+        self._queued = set()
+        self._warmed = {}
+        self._sequence = itertools.count()
+        self._interactive = 0
+        self._idle = None
+        self._task = None
+
+    def start(self):
+        """Start the scheduler on the running event loop."""
+        if self._task is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._idle = asyncio.Event()
+        if self._interactive == 0:
+            self._idle.set()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the scheduler, dropping queued jobs."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def schedule(
+        self, x, z, dimension, seed, version, flags, priority: int = PRIORITY_NEW
+    ):
+        """Queue every zoom around block (x, z) unless it is already queued."""
+        place = (x, z, dimension, seed, version, flags)
+        self._enqueue(place, [("zoom", zoom) for zoom in self.zooms], priority)
+
+    def schedule_pyramid(
+        self, x, z, dimension, seed, version, flags, priority: int = PRIORITY_HOT
+    ):
+        """Queue every pyramid level around block (x, z), see ZoomPyramid."""
+        place = (x, z, dimension, seed, version, flags)
+        self._enqueue(place, [("scale", scale) for scale in self.scales], priority)
+
+    def _enqueue(self, place, jobs, priority):
+        if self._queue is None:
+            raise RuntimeError("The scheduler has not been started")
+        for job in jobs:
+            key = place + job
+            if key in self._queued:
+                continue
+            self._queued.add(key)
+            self._queue.put_nowait((priority, next(self._sequence), key))
+
+    def record_view(self, x, z, dimension, seed, version, flags):
+        """Count a map view so idle time goes to the most viewed places."""
+        self.views[(x, z, dimension, seed, version, flags)] += 1
+        if len(self.views) > self.max_places:
+            # Halve at once so pruning stays rare
+            self.views = Counter(dict(self.views.most_common(self.max_places // 2)))
+
+    @asynccontextmanager
+    async def interactive(self):
+        """Pause the scheduler while an interactive render runs.
+
+        A job that is already running is left to finish.
+        """
+        self._interactive += 1
+        if self._idle is not None:
+            self._idle.clear()
+        try:
+            yield
+        finally:
+            self._interactive -= 1
+            if self._interactive == 0 and self._idle is not None:
+                self._idle.set()
+
+    def _record_warmed(self, place):
+        # Reinserted so the dict stays ordered from least to most recent
+        self._warmed.pop(place, None)
+        self._warmed[place] = time.monotonic()
+        while len(self._warmed) > self.max_places:
+            del self._warmed[next(iter(self._warmed))]
+
+    def _schedule_hot(self):
+        now = time.monotonic()
+        for place, _ in self.views.most_common(self.hot_count):
+            if now - self._warmed.get(place, float("-inf")) >= self.rewarm_after:
+                self.schedule_pyramid(*place)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                _, _, key = await asyncio.wait_for(self._queue.get(), self.idle_after)
+            except asyncio.TimeoutError:
+                self._schedule_hot()
+                continue
+
+            await self._idle.wait()
+            x, z, dimension, seed, version, flags, kind, value = key
+            kwargs = {
+                "x": x,
+                "z": z,
+                "dimension": dimension,
+                "seed": seed,
+                "version": version,
+                "flags": flags,
+                kind: value,
+            }
+            started = time.monotonic()
+            try:
+                await loop.run_in_executor(
+                    self._executor,
+                    _warm_map if kind == "zoom" else _build_level,
+                    kwargs,
+                )
+            except Exception as e:
+                logging.error(f"Failed to pre-warm map at ({x}, {z}): {e}")
+            finally:
+                self._queued.discard(key)
+            elapsed = time.monotonic() - started
+            self._record_warmed(key[:-2])
+
+            # Sleep off the rest of the time slice to stay within the budget
+            await asyncio.sleep(elapsed * (1 - self.cpu_budget) / self.cpu_budget)
@@ -0,0 +1,49 @@
+import math
+
+# The sampling scales cubiomes generates natively, in blocks per cell
+NATIVE_SCALES = (1, 4, 16, 64, 256)
+
+
+def nearest_native_scale(blocks_per_pixel):
+    """Pick the native scale closest to the requested resolution, finer on ties."""
+    target = math.log(max(blocks_per_pixel, 1))
+    return min(NATIVE_SCALES, key=lambda scale: abs(math.log(scale) - target))
+
+
+class ZoomPyramid:
+    """Precomputes every native scale around hot regions into a tile cache.
+
+    Each level covers the same number of cells, so coarser levels cover a
+    wider area. The default of 2048 cells covers an 800 pixel wide map at
+    every zoom that resolves to that level. Renders at any zoom then pick
+    the nearest level from the tile cache and resample it instead of
+    generating.
+    """
+
+    def __init__(self, cubiomes, tile_cache, cells: int = 2048):
+        self.cubiomes = cubiomes
+        self.tile_cache = tile_cache
+        self.cells = cells
+
+    def build(self, x, z, dimension, seed, version, flags, scales=NATIVE_SCALES):
+        """Generate and cache every level centered on block (x, z).
+
+        Tiles that are already cached are not generated again.
+        """
+        for scale in scales:
+            self.build_level(x, z, dimension, seed, version, flags, scale)
+
+    def build_level(self, x, z, dimension, seed, version, flags, scale):
+        half = self.cells // 2
+        self.tile_cache.get_area(
+            self.cubiomes,
+            version.value,
+            flags.value,
+            seed,
+            dimension.value,
+            x // scale - half,
+            z // scale - half,
+            self.cells,
+            self.cells,
+            scale,
+        )
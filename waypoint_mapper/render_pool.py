@@ -0,0 +1,131 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from waypoint_mapper.map_generator import MapGenerator
+from waypoint_mapper.metrics import MetricsSink, report_timings
+from waypoint_mapper.tile_cache import TileCache
+
+# The MapGenerator of the current worker process, created once by _init_worker
+_worker_generator = None
+
+
+def _init_worker(dll_path, tile_cache_dir, tile_cache_bytes):
+    global _worker_generator
+    tile_cache = None
+    if tile_cache_dir is not None:
+        tile_cache = TileCache(tile_cache_dir, tile_cache_bytes)
+    # Timings are reported by the pool in the parent process
+    _worker_generator = MapGenerator(
+        dll_path, tile_cache=tile_cache, slow_render_seconds=None
+    )
+
+
+def _render_map_image(kwargs):
+    return _worker_generator.generate_map_image(**kwargs)
+
+
+class RenderPool:
+    """Renders maps in worker processes without blocking the event loop.
+
+    Each worker loads the native library once and keeps its MapGenerator, so
+    seeded generators stay warm between renders. The stage timings of each
+    render come back in image.info["render_timings"] and are reported to
+    metrics from the parent process.
+
+    Every worker has its own queue. Renders of a viewport always go to the
+    same worker, which keeps that viewport's last biome grid for panning.
+    Other renders go to the worker with the fewest jobs in flight.
+    """
+
+    def __init__(
+        self,
+        dll_path: str = None,
+        max_workers: int = None,
+        tile_cache_dir: str = None,
+        tile_cache_bytes: int = 512 * 1024 * 1024,
+        mp_context=None,
+        metrics: MetricsSink = None,
+        slow_render_seconds: float = 2.0,
+    ):
+        self.metrics = metrics
+        self.slow_render_seconds = slow_render_seconds
+        self._executors = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(dll_path, tile_cache_dir, tile_cache_bytes),
+            )
+            for _ in range(max_workers or os.cpu_count() or 1)
+        ]
+        self._in_flight = [0] * len(self._executors)
+
+    def _worker_for(self, viewport):
+        if viewport is not None:
+            return hash(viewport) % len(self._executors)
+        return min(range(len(self._executors)), key=self._in_flight.__getitem__)
+
+    async def render_map_image(
+        self,
+        name,
+        color,
+        x,
+        z,
+        dimension,
+        seed,
+        version,
+        flags,
+        zoom=1.0,
+        aspect_ratio=4 / 3,
+        viewport=None,
+        timeout: float = None,
+    ):
+        """Render a map in a worker process.
+
+        Cancelling the awaiting task, or hitting the timeout, drops the job if
+        it has not started yet. A job that is already running is left to
+        finish and its result is discarded.
+
+        Renders of the same viewport run on the same worker, so a pan reuses
+        the biome grid of the viewport's last render.
+
+        Raises:
+            asyncio.TimeoutError: If the render does not finish in time.
+        """
+        loop = asyncio.get_running_loop()
+        worker = self._worker_for(viewport)
+        self._in_flight[worker] += 1
+        future = loop.run_in_executor(
+            self._executors[worker],
+            _render_map_image,
+            {
+                "name": name,
+                "color": color,
+                "x": x,
+                "z": z,
+                "dimension": dimension,
+                "seed": seed,
+                "version": version,
+                "flags": flags,
+                "zoom": zoom,
+                "aspect_ratio": aspect_ratio,
+                "viewport": viewport,
+            },
+        )
+        future.add_done_callback(lambda _: self._finished(worker))
+        image = await asyncio.wait_for(future, timeout)
+        report_timings(
+            image.info["render_timings"],
+            self.metrics,
+            self.slow_render_seconds,
+            f"map at ({x}, {z}) zoom {zoom}",
+        )
+        return image
+
+    def _finished(self, worker):
+        self._in_flight[worker] -= 1
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers, dropping any jobs that have not started."""
+        for executor in self._executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
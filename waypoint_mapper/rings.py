@@ -0,0 +1,15 @@
+def ring_cells(center_x, center_z, ring):
+    """Yield the cells at Chebyshev distance ring from the center cell.
+
+    Searches visit rings of increasing distance so they can stop once
+    nothing further out can be closer than what was found.
+    """
+    if ring == 0:
+        yield center_x, center_z
+        return
+    for offset in range(-ring, ring + 1):
+        yield center_x + offset, center_z - ring
+        yield center_x + offset, center_z + ring
+    for offset in range(-ring + 1, ring):
+        yield center_x - ring, center_z + offset
+        yield center_x + ring, center_z + offset
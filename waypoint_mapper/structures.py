@@ -0,0 +1,261 @@
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from waypoint_mapper.cubiomes_wrapper import CubiomesWrapper, Flags, StructureType
+from waypoint_mapper.rings import ring_cells
+
+# The CubiomesWrapper of the current worker process, created once by _init_worker
+_worker_cubiomes = None
+
+
+def _init_worker(dll_path):
+    global _worker_cubiomes
+    _worker_cubiomes = CubiomesWrapper(dll_path)
+
+
+def _find_block_structures(version, flags, seed, structure, regions):
+    return _worker_cubiomes.find_structures(version, flags, seed, structure, *regions)
+
+
+class StructureIndex:
+    """An on-disk index of structure positions for one (seed, version).
+
+    Structure positions are computed in blocks of block_regions by
+    block_regions placement regions, checked for biome viability by
+    cubiomes, and stored one .npy file per block. A block that has been
+    stored is never computed again, so interrupted builds resume where they
+    stopped. Nearest-structure queries then read stored blocks in rings
+    around the query point instead of scanning.
+    """
+
+    def __init__(
+        self,
+        seed,
+        version,
+        flags=Flags.DEFAULT,
+        directory: str = "./structure_index",
+        block_regions: int = 16,
+        dll_path: str = None,
+    ):
+        self.seed = seed
+        self.version = version
+        self.flags = flags
+        self.block_regions = block_regions
+        self.dll_path = dll_path
+        self.directory = os.path.join(
+            directory, f"{int(seed)}_{int(version)}_{int(flags)}"
+        )
+        self._cubiomes = None
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def cubiomes(self):
+        if self._cubiomes is None:
+            self._cubiomes = CubiomesWrapper(self.dll_path)
+        return self._cubiomes
+
+    def block_span(self, structure):
+        """Return the width in blocks of one index block, or None if the structure does not generate."""
+        region_size = self.cubiomes.get_structure_region_size(structure, self.version)
+        if region_size <= 0:
+            return None
+        return self.block_regions * region_size * 16
+
+    def _block_regions(self, block_x, block_z):
+        size = self.block_regions
+        return (
+            block_x * size,
+            block_z * size,
+            (block_x + 1) * size - 1,
+            (block_z + 1) * size - 1,
+        )
+
+    def _block_path(self, structure, block_x, block_z):
+        return os.path.join(
+            self.directory, structure.name.lower(), f"{block_x}_{block_z}.npy"
+        )
+
+    def _store_block(self, structure, block_x, block_z, positions):
+        path = self._block_path(structure, block_x, block_z)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as file:
+            np.save(file, positions)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._blocks[(structure, block_x, block_z)] = positions
+
+    def _load_block(self, structure, block_x, block_z, compute=True):
+        key = (structure, block_x, block_z)
+        with self._lock:
+            positions = self._blocks.get(key)
+        if positions is not None:
+            return positions
+
+        path = self._block_path(structure, block_x, block_z)
+        try:
+            positions = np.load(path)
+        except (OSError, ValueError):
+            if not compute:
+                return None
+            positions = self.cubiomes.find_structures(
+                self.version,
+                self.flags,
+                self.seed,
+                structure,
+                *self._block_regions(block_x, block_z),
+            )
+            self._store_block(structure, block_x, block_z, positions)
+            return positions
+
+        with self._lock:
+            self._blocks[key] = positions
+        return positions
+
+    def build(self, structures, x, z, radius, max_workers=None, progress=None):
+        """Index every block within radius blocks of (x, z) across worker processes.
+
+        Blocks that are already stored are skipped.
+
+        Args:
+            structures (list): StructureType members to index.
+            progress (callable): Called with (done, total) after each block.
+        """
+        pending = []
+        for structure in map(StructureType, structures):
+            if structure == StructureType.STRONGHOLD:
+                self.strongholds()
+                continue
+            span = self.block_span(structure)
+            if span is None:
+                continue
+            for block_z in range((z - radius) // span, (z + radius) // span + 1):
+                for block_x in range((x - radius) // span, (x + radius) // span + 1):
+                    if not os.path.exists(
+                        self._block_path(structure, block_x, block_z)
+                    ):
+                        pending.append((structure, block_x, block_z))
+
+        if not pending:
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(self.dll_path,),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _find_block_structures,
+                    self.version,
+                    self.flags,
+                    self.seed,
+                    structure,
+                    self._block_regions(block_x, block_z),
+                ): (structure, block_x, block_z)
+                for structure, block_x, block_z in pending
+            }
+            # Store blocks as they finish so an interrupted build can resume
+            for done, future in enumerate(as_completed(futures), 1):
+                self._store_block(*futures[future], future.result())
+                if progress is not None:
+                    progress(done, len(pending))
+
+    def strongholds(self):
+        """Return the block positions of every stronghold, computing them once."""
+        key = (StructureType.STRONGHOLD, 0, 0)
+        with self._lock:
+            positions = self._blocks.get(key)
+        if positions is not None:
+            return positions
+
+        path = os.path.join(self.directory, "strongholds.npy")
+        try:
+            positions = np.load(path)
+        except (OSError, ValueError):
+            positions = self.cubiomes.find_strongholds(
+                self.version, self.flags, self.seed
+            )
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "wb") as file:
+                np.save(file, positions)
+
+        with self._lock:
+            self._blocks[key] = positions
+        return positions
+
+    def nearest(self, structure, x, z, max_distance=20000, compute=True):
+        """Find the structure closest to block (x, z).
+
+        Blocks are visited in rings around the query point until no closer
+        structure can exist. Missing blocks are computed and stored unless
+        compute is False, in which case they are skipped.
+
+        Returns:
+            tuple: The (x, z) position and distance of the nearest structure,
+            or None if there is none within max_distance.
+        """
+        structure = StructureType(structure)
+        if structure == StructureType.STRONGHOLD:
+            positions = self.strongholds()
+            if len(positions) == 0:
+                return None
+            return _closest(positions, x, z, max_distance)
+
+        span = self.block_span(structure)
+        if span is None:
+            return None
+
+        center_x, center_z = x // span, z // span
+        best = None
+        for ring in range(math.ceil(max_distance / span) + 1):
+            for block_x, block_z in ring_cells(center_x, center_z, ring):
+                positions = self._load_block(structure, block_x, block_z, compute)
+                if positions is None or len(positions) == 0:
+                    continue
+                found = _closest(positions, x, z, max_distance)
+                if found is not None and (best is None or found[1] < best[1]):
+                    best = found
+            # Anything in the next ring is at least ring * span blocks away
+            if best is not None and best[1] <= ring * span:
+                break
+        return best
+
+    def within(self, structure, x, z, radius, compute=True):
+        """Return every indexed structure within radius blocks of (x, z), nearest first."""
+        structure = StructureType(structure)
+        if structure == StructureType.STRONGHOLD:
+            blocks = [self.strongholds()]
+        else:
+            span = self.block_span(structure)
+            if span is None:
+                return []
+            blocks = [
+                self._load_block(structure, block_x, block_z, compute)
+                for block_z in range((z - radius) // span, (z + radius) // span + 1)
+                for block_x in range((x - radius) // span, (x + radius) // span + 1)
+            ]
+
+        blocks = [positions for positions in blocks if positions is not None]
+        if not blocks:
+            return []
+        positions = np.concatenate(blocks).astype(np.int64)
+        distances = np.hypot(positions[:, 0] - x, positions[:, 1] - z)
+        order = np.argsort(distances)
+        return [
+            ((int(positions[i, 0]), int(positions[i, 1])), float(distances[i]))
+            for i in order
+            if distances[i] <= radius
+        ]
+
+
+def _closest(positions, x, z, max_distance):
+    positions = positions.astype(np.int64)
+    distances = np.hypot(positions[:, 0] - x, positions[:, 1] - z)
+    index = int(np.argmin(distances))
+    if distances[index] > max_distance:
+        return None
+    return (int(positions[index, 0]), int(positions[index, 1])), float(distances[index])
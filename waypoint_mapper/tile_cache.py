@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# Near sea level. cubiomes takes y in blocks at 1:1 but at 1:4 at every
+# coarser scale, see sample_y
+SURFACE_Y = 60
+
+# The directory is rescanned after every 1/RESCAN_FRACTION of max_bytes written
+RESCAN_FRACTION = 16
+
+
+def sample_y(scale):
+    """Return the y to pass cubiomes so a scale samples block SURFACE_Y."""
+    return SURFACE_Y if scale == 1 else SURFACE_Y // 4
+
+
+class TileCache:
+    """An on-disk cache of biome ID tiles with size-bounded LRU eviction.
+
+    Tiles are tile_size by tile_size cells at a cubiomes scale, keyed by
+    (seed, version, flags, dimension, scale, tile_x, tile_z), and stored as
+    uint8 .npy files. Least recently used tiles are deleted once the cache
+    grows past max_bytes.
+
+    Several processes can share one directory. Each process only sees its
+    own writes between scans, so the directory is rescanned after every
+    max_bytes / RESCAN_FRACTION written and the bound holds across all of
+    them, give or take what the others wrote since. Access order is kept
+    in file modification times, touched at most once per touch_interval
+    seconds per tile so hits rarely write to disk.
+    """
+
+    def __init__(
+        self,
+        directory: str = "./tile_cache",
+        max_bytes: int = 512 * 1024 * 1024,
+        tile_size: int = 256,
+        touch_interval: float = 60.0,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        # Path to (size, last access time), least recently used first
+        self._files = OrderedDict()
+        self._total_bytes = 0
+        self._written = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _scan(self):
+        """List every tile in the directory as (mtime, path, size)."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                if not file.endswith(".npy"):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _load_index(self):
+        """Rebuild the index from the directory, keeping newer access times."""
+        entries = self._scan()
+        with self._lock:
+            # Hits within touch_interval are only recorded in memory
+            entries = [
+                (max(mtime, self._files.get(path, (0, 0))[1]), path, size)
+                for mtime, path, size in entries
+            ]
+            # Oldest access first so eviction picks them first
+            self._files = OrderedDict(
+                (path, (size, accessed)) for accessed, path, size in sorted(entries)
+            )
+            self._total_bytes = sum(size for _, _, size in entries)
+            self._written = 0
+
+    def _tile_path(self, seed, version, flags, dimension, scale, tile_x, tile_z):
+        world = f"{int(seed)}_{int(version)}_{int(flags)}_{int(dimension)}"
+        return os.path.join(
+            self.directory,
+            world,
+            f"{int(scale)}_y{SURFACE_Y}",
+            f"{tile_x}_{tile_z}.npy",
+        )
+
+    def get_tile(
+        self, cubiomes, version, flags, seed, dimension, scale, tile_x, tile_z
+    ):
+        """Return one tile, generating and storing it if it is not cached."""
+        path = self._tile_path(seed, version, flags, dimension, scale, tile_x, tile_z)
+        tile = self._read(path)
+        if tile is not None:
+            return tile
+
+        size = self.tile_size
+        grid = cubiomes.generate_biome_grid(
+            version,
+            flags,
+            seed,
+            dimension,
+            tile_x * size,
+            tile_z * size,
+            size,
+            size,
+            sample_y(scale),
+            1,
+            scale,
+        )
+        # Biome IDs fit in a byte; the -1 "no biome" marker wraps to 255
+        tile = grid.astype(np.uint8)
+        self._write(path, tile)
+        return tile
+
+    def get_area(self, cubiomes, version, flags, seed, dimension, x, z, sx, sz, scale):
+        """Compose an sx by sz grid of biome IDs starting at cell (x, z) from tiles.
+
+        Only tiles that are not already cached are generated.
+        """
+        size = self.tile_size
+        area = np.empty((sz, sx), dtype=np.uint8)
+        for tile_z in range(z // size, (z + sz - 1) // size + 1):
+            for tile_x in range(x // size, (x + sx - 1) // size + 1):
+                tile = self.get_tile(
+                    cubiomes, version, flags, seed, dimension, scale, tile_x, tile_z
+                )
+
+                # Copy the part of the tile that overlaps the requested area
+                x0 = max(x, tile_x * size)
+                x1 = min(x + sx, (tile_x + 1) * size)
+                z0 = max(z, tile_z * size)
+                z1 = min(z + sz, (tile_z + 1) * size)
+                area[z0 - z : z1 - z, x0 - x : x1 - x] = tile[
+                    z0 - tile_z * size : z1 - tile_z * size,
+                    x0 - tile_x * size : x1 - tile_x * size,
+                ]
+        return area
+
+    def _read(self, path):
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None:
+                self._files.move_to_end(path)
+        if entry is None:
+            try:
+                # Written by another process sharing the cache directory
+                stat = os.stat(path)
+            except OSError:
+                with self._lock:
+                    self.misses += 1
+                return None
+            entry = (stat.st_size, stat.st_mtime)
+            with self._lock:
+                if path not in self._files:
+                    self._files[path] = entry
+                    self._total_bytes += entry[0]
+
+        try:
+            tile = np.load(path)
+            now = time.time()
+            if now - entry[1] >= self.touch_interval:
+                # Persist the access order for other processes and restarts
+                os.utime(path)
+                with self._lock:
+                    if path in self._files:
+                        self._files[path] = (entry[0], now)
+        except (OSError, ValueError):
+            with self._lock:
+                self._total_bytes -= self._files.pop(path, (0, 0))[0]
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return tile
+
+    def _write(self, path, tile):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as file:
+            np.save(file, tile)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._total_bytes += size - self._files.pop(path, (0, 0))[0]
+            self._files[path] = (size, time.time())
+            self._written += size
+            rescan = self._written >= self.max_bytes // RESCAN_FRACTION
+        if rescan:
+            # Count what the other processes wrote since the last scan
+            self._load_index()
+
+        evicted = []
+        with self._lock:
+            while self._total_bytes > self.max_bytes and len(self._files) > 1:
+                old_path, (old_size, _) = self._files.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_path)
+
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "tiles": len(self._files),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }